@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import time
+from datetime import datetime, timedelta
+
+from models import TaskInstance, TaskInstanceArchive, db
+
+ARCHIVE_DAYS_DEFAULT = 365
+ARCHIVE_BATCH_SIZE = 10000  # rows moved per transaction
+
+ARCHIVED = ('Archived {instances} history items done before {cutoff} '
+            '({seconds:.3f}s)')
+
+# not the id: sqlite hands the ids of archived rows out again (no
+# AUTOINCREMENT), so the archive numbers its rows itself
+ARCHIVE_FIELDS = ['task', 'note', 'due', 'done']
+
+
+def archive_task_instances(days=ARCHIVE_DAYS_DEFAULT, now=None,
+                           batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move history items done more than days ago from TaskInstance to
+    TaskInstanceArchive, batch_size rows (one insert and one delete)
+    per transaction, in id order (which the archive's own ids keep).
+
+    :return: number of history items archived
+    """
+    start = time.time()
+    cutoff = (now if now else datetime.now()) - timedelta(days=days)
+    cutoff = cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    archived = 0
+    last_id = 0
+    while True:
+        # the last id of this batch, or None for the remaining rows
+        bound = (TaskInstance
+                 .select(TaskInstance.id)
+                 .where(TaskInstance.id > last_id, TaskInstance.done < cutoff)
+                 .order_by(TaskInstance.id)
+                 .offset(batch_size - 1)
+                 .limit(1)
+                 .scalar())
+
+        batch = (TaskInstance.id > last_id) & (TaskInstance.done < cutoff)
+        if bound is not None:
+            batch &= TaskInstance.id <= bound
+
+        with db.atomic():
+            (TaskInstanceArchive
+             .insert_from(
+                [getattr(TaskInstanceArchive, f) for f in ARCHIVE_FIELDS],
+                (TaskInstance
+                 .select(*[getattr(TaskInstance, f) for f in ARCHIVE_FIELDS])
+                 .where(batch)
+                 .order_by(TaskInstance.id))
+              )
+             .execute())
+            archived += TaskInstance.delete().where(batch).execute()
+
+        if bound is None:
+            break
+        last_id = bound
+
+    print(ARCHIVED.format(
+        instances=archived,
+        cutoff=cutoff.date().isoformat(),
+        seconds=time.time() - start
+    ))
+    return archived
@@ -5,6 +5,12 @@ from __future__ import (absolute_import, division, print_function,
 
 import argparse
 
+from batch import BATCH_SIZE_DEFAULT
+from config import PRAGMA_PROFILES
+from querystats import SLOW_MS_DEFAULT
+from render import COLOR_MODES
+from util import PURGE_DAYS_DEFAULT
+
 
 class ArgHandler(object):
 
@@ -26,16 +32,122 @@ class ArgHandler(object):
             help='todo database file'
         )
 
+        parser.add_argument(
+            '--db-profile',
+            type=str, choices=sorted(PRAGMA_PROFILES.keys()),
+            help='sqlite performance settings (default: from config '
+                 'file, or "default")'
+        )
+
+        parser.add_argument(
+            '--config',
+            type=str, metavar='FILE',
+            help='config file (default: ~/.todo.ini)'
+        )
+
+        parser.add_argument(
+            '--color',
+            type=str, choices=COLOR_MODES,
+            help='colored list and history output (default: auto, '
+                 'i.e. only on a terminal)'
+        )
+
         parser.add_argument(
             '-o', '--one-command',
             type=str, metavar='CMD',
             help='pass command to interpreter and exit afterwards'
         )
 
+        parser.add_argument(
+            '--maintain',
+            type=int, metavar='DAYS', nargs='?', const=PURGE_DAYS_DEFAULT,
+            help='purge tasks deleted more than DAYS ago (default: '
+                 '%(const)s), analyze, vacuum and check the database, '
+                 'then exit'
+        )
+
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='print the top cProfile hotspots after each command'
+        )
+
+        parser.add_argument(
+            '--profile-output',
+            type=str, metavar='FILE',
+            help='profile all commands, writing the data to file on exit'
+        )
+
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='print SQL statement counts and times to stderr on exit'
+        )
+
+        parser.add_argument(
+            '--slow-query-log',
+            type=str, metavar='FILE',
+            help='append slow SQL statements to file'
+        )
+
+        parser.add_argument(
+            '--slow-query-ms',
+            type=float, metavar='MS', default=SLOW_MS_DEFAULT,
+            help='slow query log threshold (default: %(default)s)'
+        )
+
         parser.add_argument(
             '-e', '--export',
             action='store_true',
             help='print todo database in json format'
         )
 
+        parser.add_argument(
+            '-s', '--stream',
+            action='store_true',
+            help='export: write each task as soon as it is read'
+        )
+
+        parser.add_argument(
+            '--ndjson',
+            action='store_true',
+            help='export: write one json task per line (streamed)'
+        )
+
+        parser.add_argument(
+            '--archived',
+            action='store_true',
+            help='export: include archived history'
+        )
+
+        parser.add_argument(
+            '--output',
+            type=str, metavar='FILE',
+            help='export: write to file instead of stdout'
+        )
+
+        parser.add_argument(
+            '-i', '--import',
+            type=str, metavar='FILE', dest='import_file',
+            help="load json export into database ('-' for stdin)"
+        )
+
+        parser.add_argument(
+            '-b', '--batch',
+            type=str, metavar='FILE',
+            help="run commands from file, one per line ('-' for stdin)"
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int, metavar='N', default=BATCH_SIZE_DEFAULT,
+            help='batch: commands per transaction (default: %(default)s)'
+        )
+
+        parser.add_argument(
+            '-k', '--keep-going',
+            action='store_true',
+            help='batch: continue after errors'
+        )
+
         return parser.parse_args(args)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import time
+
+BATCH_SIZE_DEFAULT = 1000
+BATCH_SUMMARY = ('Batch {num}: {commands} commands, {errors} errors '
+                 '({seconds:.3f}s)')
+BATCH_FAILED = ('*** Batch {num} rolled back: {error} '
+                '(its {commands} commands not applied)')
+BATCH_STOPPED = 'Stopped after error'
+
+
+def run_batch(interpreter, f, batch_size=BATCH_SIZE_DEFAULT,
+              keep_going=False):
+    """
+    Run the commands in f, one per line, through the interpreter.
+    Every batch_size commands share one transaction; a summary line is
+    printed after each batch. Blank lines and lines starting with '#'
+    are skipped.
+
+    A command that fails (Command.failed) changes nothing, so the
+    commands before it are kept. One that raises rolls back its whole
+    batch: with keep_going the commands run so far in that batch stay
+    undone, and the next batch starts with the command after it.
+
+    :param keep_going: carry on after a command fails (stop after that
+                       command's batch otherwise)
+    :return: True if there were no errors
+    """
+    from models import db
+
+    commands = _iter_commands(f)
+    num = 0
+    ok = True
+    while True:
+        num += 1
+        batch = _Batch(num)
+        try:
+            with db.atomic():
+                quit_requested = batch.run(
+                    interpreter, commands, batch_size, keep_going
+                )
+        except Exception as e:
+            batch.errors += 1
+            batch.print_summary()
+            print(BATCH_FAILED.format(num=num, error=e,
+                                      commands=batch.commands))
+            ok = False
+            if keep_going:
+                continue
+            print(BATCH_STOPPED)
+            return ok
+
+        if batch.commands:
+            batch.print_summary()
+        if batch.errors:
+            ok = False
+            if not keep_going:
+                print(BATCH_STOPPED)
+                return ok
+        if quit_requested or batch.commands < batch_size:
+            return ok
+
+
+class _Batch(object):
+
+    def __init__(self, num):
+        self.num = num
+        self.commands = 0
+        self.errors = 0
+        self.start = time.time()
+
+    def run(self, interpreter, commands, batch_size, keep_going):
+        """ :return: True if a command asked to quit """
+        for line in commands:
+            self.commands += 1
+            stop = interpreter.onecmd(line)
+            if interpreter.failed:
+                self.errors += 1
+                if not keep_going:
+                    return False
+            if stop:
+                return True
+            if self.commands == batch_size:
+                return False
+        return False
+
+    def print_summary(self):
+        print(BATCH_SUMMARY.format(
+            num=self.num,
+            commands=self.commands,
+            errors=self.errors,
+            seconds=time.time() - self.start
+        ))
+
+
+def _iter_commands(f):
+    for line in f:
+        line = ' '.join(line.split())
+        if line and not line.startswith('#'):
+            yield line
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+Time the todo commands against generated databases of several sizes:
+
+    benchmark.py --scales 1000,100000,1000000 --output results.json
+
+Each command is run through Command.onecmd (export through todo.main)
+with its output thrown away. Latency percentiles and the peak memory of
+each scale go to the results file, and are compared against the
+baseline file if there is one (save one with --save-baseline).
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import create_data
+
+SCALES_DEFAULT = '1000,100000,1000000'
+INSTANCES_PER_TASK = 10
+RUNS_DEFAULT = 20
+EXPORT_RUNS_DEFAULT = 3
+BASELINE_DEFAULT = 'benchmark_baseline.json'
+THRESHOLD_DEFAULT = 0.2
+PERCENTILES = [50, 90, 99]
+
+BENCHMARK_PRIORITIES = [(1, 30), (2, 30), (3, 20), (4, 15), (9, 5)]
+
+SCALE_HEADER = 'Scale {scale}: {tasks} tasks, peak memory {memory} KB'
+RESULT_LINE = '  {name:12} p50 {p50:9.3f} ms  p90 {p90:9.3f} ms'
+COMPARE_LINE = ('  {name:12} p50 {p50:9.3f} ms  baseline {base:9.3f} ms  '
+                '{change:+6.1%}{flag}')
+REGRESSION_FLAG = '  REGRESSION'
+REGRESSIONS = '*** {count} regression(s) over {threshold:.0%}'
+INVALID_SCALES = '*** Invalid scales: '
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]  # pragma: no cover
+
+    args = get_args(argv)
+    scales = parse_scales(args.scales)
+    if scales is None:
+        return 1
+
+    results = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'scales': {},
+    }
+    for scale in scales:
+        scale_results = run_scale(
+            scale,
+            args.dir,
+            runs=args.runs,
+            export_runs=args.export_runs
+        )
+        results['scales'][str(scale)] = scale_results
+        print_scale(scale, scale_results)
+
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        return 0
+
+    if os.path.exists(args.baseline):
+        with io.open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+def get_args(args):
+    parser = argparse.ArgumentParser(prog='benchmark.py')
+
+    parser.add_argument(
+        '--scales',
+        type=str, default=SCALES_DEFAULT, metavar='N,N,...',
+        help='database sizes, in history items (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--runs',
+        type=int, default=RUNS_DEFAULT, metavar='N',
+        help='times to run each command (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--export-runs',
+        type=int, default=EXPORT_RUNS_DEFAULT, metavar='N',
+        help='times to run the export (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--dir',
+        type=str, default=tempfile.gettempdir(),
+        help='where to build the databases (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--output',
+        type=str, metavar='FILE',
+        help='write the results to FILE as json'
+    )
+
+    parser.add_argument(
+        '--baseline',
+        type=str, default=BASELINE_DEFAULT, metavar='FILE',
+        help='results to compare against (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='write the results to the baseline file instead of '
+             'comparing against it'
+    )
+
+    parser.add_argument(
+        '--threshold',
+        type=float, default=THRESHOLD_DEFAULT, metavar='RATIO',
+        help='p50 slowdown that counts as a regression '
+             '(default: %(default)s)'
+    )
+
+    return parser.parse_args(args)
+
+
+def parse_scales(scales):
+    """ :return: None (invalid), or list of ints, e.g. '10,100' """
+    try:
+        values = [int(scale) for scale in scales.split(',')]
+    except ValueError:
+        values = []
+    if not values or min(values) < INSTANCES_PER_TASK:
+        print(INVALID_SCALES + scales)
+        return None
+    return values
+
+
+def run_scale(scale, db_dir, runs=RUNS_DEFAULT,
+              export_runs=EXPORT_RUNS_DEFAULT):
+    """
+    Build a database with scale history items and time the commands
+    against it in a fresh process, so that peak memory is its own.
+
+    :return: dict of tasks, build_seconds, peak_memory_kb and commands
+             (name: dict of runs and latency percentiles in ms)
+    """
+    db_file = os.path.join(db_dir, 'benchmark_{scale}.sqlite'.format(
+        scale=scale
+    ))
+    if os.path.exists(db_file):
+        os.remove(db_file)
+
+    start = time.time()
+    num_tasks = scale // INSTANCES_PER_TASK
+    create_data.create_data(
+        db_file,
+        num_tasks=num_tasks,
+        instances_per_task=INSTANCES_PER_TASK,
+        priorities=BENCHMARK_PRIORITIES
+    )
+    build_seconds = time.time() - start
+
+    pool = multiprocessing.Pool(1)
+    try:
+        results = pool.apply(
+            _time_commands,
+            (db_file, num_tasks, runs, export_runs)
+        )
+    finally:
+        pool.close()
+        pool.join()
+        os.remove(db_file)
+
+    results['tasks'] = num_tasks
+    results['build_seconds'] = round(build_seconds, 3)
+    return results
+
+
+def _time_commands(db_file, num_tasks, runs, export_runs):
+    # runs in the worker process
+    from arghandler import ArgHandler
+    from command import Command
+    import todo
+
+    def task_name(i):
+        # spread over the table rather than hitting one task
+        return create_data.TASK_NAME.format(
+            num=1 + i * num_tasks // runs
+        )
+
+    def complete(interpreter, i):
+        interpreter.task_names = None  # as on the first completion
+        interpreter.complete_done(task_name(i)[:-2], '', 0, 0)
+
+    def export(i):
+        todo.main(['-d', db_file, '--export', '--output', os.devnull])
+
+    line_benchmarks = [
+        ('list', lambda i: 'list'),
+        ('list due', lambda i: 'list due'),
+        ('next', lambda i: 'next'),
+        ('history', lambda i: 'history ' + task_name(i)),
+        ('due', lambda i: 'due {task} 5d'.format(task=task_name(i))),
+        ('done', lambda i: 'done ' + task_name(i)),
+        ('add', lambda i: 'add "benchmark {i}" 2'.format(i=i)),
+        ('delete', lambda i: 'delete benchmark {i}'.format(i=i)),
+    ]
+
+    results = {'commands': {}}
+    save_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        with Command(ArgHandler.get_args(['-d', db_file])) as interpreter:
+            for name, get_line in line_benchmarks:
+                results['commands'][name] = _time_runs(
+                    lambda i: interpreter.onecmd(get_line(i)), runs
+                )
+            results['commands']['complete'] = _time_runs(
+                lambda i: complete(interpreter, i), runs
+            )
+        # last: export opens (and closes) the database itself
+        results['commands']['export'] = _time_runs(
+            export, export_runs
+        )
+    finally:
+        sys.stdout.close()
+        sys.stdout = save_stdout
+
+    # ru_maxrss is in KB on linux (bytes on macOS)
+    results['peak_memory_kb'] = resource.getrusage(
+        resource.RUSAGE_SELF
+    ).ru_maxrss
+    return results
+
+
+def _time_runs(run, runs):
+    times = []
+    for i in range(runs):
+        start = time.time()
+        run(i)
+        times.append((time.time() - start) * 1000)
+    return get_percentiles(times)
+
+
+def get_percentiles(times):
+    """ :return: dict of runs, max_ms and p<n>_ms for PERCENTILES """
+    times = sorted(times)
+    results = {
+        'runs': len(times),
+        'max_ms': round(times[-1], 3),
+    }
+    for percentile in PERCENTILES:
+        # nearest rank
+        rank = max(1, -(-percentile * len(times) // 100))
+        key = 'p{percentile}_ms'.format(percentile=percentile)
+        results[key] = round(times[rank - 1], 3)
+    return results
+
+
+def print_scale(scale, results):
+    print(SCALE_HEADER.format(
+        scale=scale,
+        tasks=results['tasks'],
+        memory=results['peak_memory_kb']
+    ))
+    for name in sorted(results['commands']):
+        command = results['commands'][name]
+        print(RESULT_LINE.format(
+            name=name,
+            p50=command['p50_ms'],
+            p90=command['p90_ms']
+        ))
+
+
+def save_results(results, file_name):
+    with io.open(file_name, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(results, indent=4, sort_keys=True) + '\n')
+
+
+def compare_results(results, baseline, threshold=THRESHOLD_DEFAULT):
+    """
+    Print each command's p50 next to the baseline's, for the scales
+    and commands both have.
+
+    :return: number of commands whose p50 went up by more than threshold
+    """
+    regressions = 0
+    for scale in sorted(results['scales'], key=int):
+        if scale not in baseline['scales']:
+            continue
+        print('Scale {scale} against baseline:'.format(scale=scale))
+        commands = results['scales'][scale]['commands']
+        base_commands = baseline['scales'][scale]['commands']
+        for name in sorted(commands):
+            if name not in base_commands:
+                continue
+            p50 = commands[name]['p50_ms']
+            base = base_commands[name]['p50_ms']
+            change = (p50 - base) / base if base else 0
+            regression = change > threshold
+            regressions += regression
+            print(COMPARE_LINE.format(
+                name=name,
+                p50=p50,
+                base=base,
+                change=change,
+                flag=REGRESSION_FLAG if regression else ''
+            ))
+
+    if regressions:
+        print(REGRESSIONS.format(count=regressions, threshold=threshold))
+    return regressions
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
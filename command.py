@@ -5,13 +5,28 @@ from __future__ import (absolute_import, division, print_function,
 
 import cmd
 import os
+import sys
 
+import querystats
+import render
+import util
 import views
-from models import create_database, db
+from archive import ARCHIVE_DAYS_DEFAULT, archive_task_instances
+from config import get_pragmas
+from maintenance import maintain
+from models import create_database, db, init_database, upgrade_database
 
 UNKNOWN_SYNTAX = '*** Unknown syntax: '
 NO_HELP = '*** No help on '
 CREATING_DB = 'Creating todo db:\n{db}'
+PROFILE_ON = 'Profiling on'
+PROFILE_OFF = 'Profiling off'
+PROFILE_SYNTAX = '*** Syntax: profile on [FILE] | off'
+STATS_RESET = 'Stats reset'
+STATS_STARTED = 'Stats on'
+STATS_SYNTAX = '*** Syntax: stats [reset]'
+MAINTAIN_SYNTAX = '*** Syntax: maintain [days]'
+ARCHIVE_SYNTAX = '*** Syntax: archive [days]'
 
 
 # noinspection PyUnusedLocal,PyMethodMayBeStatic
@@ -27,31 +42,76 @@ class Command(cmd.Cmd, object):
             'h': self.do_history,
             'l': self.do_list,
             'll': self.do_list,
+            'n': self.do_next,
             'q': self.do_quit,
         }
 
+        # sorted names of non-deleted tasks for tab completion; built on
+        # first use, then kept up to date by add, edit and delete
+        self.task_names = None
+
+        # CommandProfiler while profiling is on
+        self.profiler = None
+
+        # whether the last command failed (printed an error), for batches
+        self.failed = False
+
+        if args.color:
+            render.set_color_mode(args.color)
+
+        # statement counts and times for the stats command, from start
+        # if asked for on the command line, from the first stats command
+        # otherwise
+        self.stats_args = args
+        self.query_stats = querystats.start(args) \
+            if querystats.wanted(args) else None
+        self.print_stats_on_exit = args.stats
+
         if not args.database:
             args.database = 'todo.sqlite'  # pragma: no cover
 
-        db.init(args.database)
-        if not os.path.exists(args.database):
+        new_database = not os.path.exists(args.database)
+        init_database(args.database, get_pragmas(args))
+        db.connect()
+
+        if new_database:
             print(CREATING_DB.format(
                 db=os.path.abspath(args.database)
             ))
             create_database()
+        else:
+            upgrade_database()
 
-        db.connect()
+        if args.profile or args.profile_output:
+            self.start_profiling(args.profile_output)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_profiling()
+        if self.query_stats:
+            if self.print_stats_on_exit:
+                # stderr: not mixed with the commands' output
+                self.query_stats.print_report(out=sys.stderr)
+            querystats.stop()
         db.close()
 
     intro = ''
 
     prompt = '> '
 
+    def onecmd(self, line):
+        self.failed = False
+        if self.query_stats is None:
+            return cmd.Cmd.onecmd(self, line)
+
+        self.query_stats.start_command(line)
+        try:
+            return cmd.Cmd.onecmd(self, line)
+        finally:
+            self.query_stats.end_command()
+
     def emptyline(self):
         pass  # pragma: no cover
 
@@ -65,6 +125,7 @@ class Command(cmd.Cmd, object):
             return self.aliases[command](arg)
         else:
             print(UNKNOWN_SYNTAX + line)
+            self.failed = True
 
     def do_help(self, arg):
         """Get help for a command; Syntax: help <COMMAND>"""
@@ -86,16 +147,31 @@ class Command(cmd.Cmd, object):
     def do_list(self, args):
         """List tasks
 
-        Syntax: list [priority] [due]
-                list [due] [priority]
+        Syntax: list [priority] [due] [--limit N] [--offset N] [--page]
+                list [due] [priority] [...]
 
         - Optionally specify a priority where only tasks less than
           or equal to that priority are listed (e.g. "list 2" will
           list all tasks with priority 1 or 2)
         - [priority] "all" or "deleted" will show deleted tasks
         - [due] "due" will show only tasks that are due right now
+        - --limit N shows at most N tasks, skipping the first
+          --offset N tasks
+        - --page shows a screen at a time, fetching more rows as you
+          page (enter to continue, 'q' to stop)
         """
-        views.list_tasks(args)
+        self.failed = not views.list_tasks(args)
+
+    def do_next(self, args):
+        """List the most urgent tasks
+
+        Syntax: next [number] [priority]
+
+        - Shows the first [number] tasks of "list" (default: 5)
+        - Optionally specify a priority where only tasks less than
+          or equal to that priority are considered
+        """
+        self.failed = not views.list_next_tasks(args)
 
     def do_add(self, args):
         """Add a new task
@@ -108,7 +184,7 @@ class Command(cmd.Cmd, object):
         - Spaces in name require quotes around the name
         - Quotes around the note are optional
         """
-        views.add_task(args)
+        self.failed = not views.add_task(args, self.task_names)
 
     def do_edit(self, args):
         """Edit an existing task or task history
@@ -116,10 +192,10 @@ class Command(cmd.Cmd, object):
         Syntax: edit <task>
                 edit history <task>
         """
-        views.edit_task_or_history(args)
+        self.failed = not views.edit_task_or_history(args, self.task_names)
 
     def complete_edit(self, text, line, begidx, endidx):
-        names = views.get_task_names(starting_with=text)
+        names = self.get_task_names(starting_with=text)
         if 'history'.startswith(text):
             names.append('history')
         return names
@@ -136,10 +212,10 @@ class Command(cmd.Cmd, object):
         - If priority is already 9, it will be deleted FOREVER
         - Quotes optional (even if task name has spaces)
         """
-        views.delete_task(args)
+        self.failed = not views.delete_task(args, self.task_names)
 
     def complete_delete(self, text, line, begidx, endidx):
-        return views.get_task_names(starting_with=text)
+        return self.get_task_names(starting_with=text)
 
     # alias command completion workaround
     complete_del = complete_delete
@@ -147,12 +223,17 @@ class Command(cmd.Cmd, object):
     def do_history(self, args):
         """Show history of a task
 
-        Syntax: history <task>
+        Syntax: history <task> [--limit N] [--offset N] [--page]
+                        [--archived]
+
+        - See "help list" for the paging options
+        - --archived includes the history moved to the archive (see
+          "help archive")
         """
-        views.list_task_instances(args)
+        self.failed = not views.list_task_history(args)
 
     def complete_history(self, text, line, begidx, endidx):
-        return views.get_task_names(starting_with=text)
+        return self.get_task_names(starting_with=text)
 
     # alias command completion workaround
     complete_h = complete_history
@@ -191,10 +272,10 @@ class Command(cmd.Cmd, object):
               e.g. "1 week", "2 months", "5 days"
             - Quotes around the task name are optional (even if spaces)
         """
-        views.set_due_date(args)
+        self.failed = not views.set_due_date(args)
 
     def complete_due(self, text, line, begidx, endidx):
-        return views.get_task_names(starting_with=text)
+        return self.get_task_names(starting_with=text)
 
     def do_done(self, args):
         """Set done date of open task
@@ -205,10 +286,141 @@ class Command(cmd.Cmd, object):
         not. If there is no open task, one will be created and then
         marked done.
         """
-        views.set_done_date(args)
+        self.failed = not views.set_done_date(args)
 
     def complete_done(self, text, line, begidx, endidx):
-        return views.get_task_names(starting_with=text)
+        return self.get_task_names(starting_with=text)
+
+    def get_task_names(self, starting_with=''):
+        if self.task_names is None:
+            self.task_names = sorted(views.get_task_names())
+        return util.get_names_starting_with(self.task_names, starting_with)
+
+    def do_profile(self, args):
+        """Profile commands
+
+        Syntax: profile on [FILE]
+                profile off
+
+        - Prints the top cumulative cProfile hotspots after each
+          command, or with FILE collects the profile of every command
+          until "profile off" (or exit) and writes it to FILE, e.g.
+          for python -m pstats FILE
+        """
+        args = args.split()
+        if args[:1] == ['on'] and len(args) <= 2:
+            self.start_profiling(args[1] if len(args) == 2 else None)
+            print(PROFILE_ON)
+        elif args == ['off']:
+            self.stop_profiling()
+            print(PROFILE_OFF)
+        else:
+            print(PROFILE_SYNTAX)
+            self.failed = True
+
+    def start_profiling(self, output_file=None):
+        from profiler import CommandProfiler
+
+        self.stop_profiling()
+        self.profiler = CommandProfiler(output_file)
+        # shadows Command.onecmd on this instance only, so that commands
+        # run exactly as before while profiling is off
+        self.onecmd = self.profiled_onecmd
+
+    def stop_profiling(self):
+        if self.profiler:
+            self.profiler.close()
+            self.profiler = None
+            del self.onecmd
+
+    def profiled_onecmd(self, line):
+        if line.split()[:1] == ['profile']:
+            return Command.onecmd(self, line)
+        return self.profiler.run(Command.onecmd, self, line)
+
+    def do_stats(self, args):
+        """Show SQL statement counts and times
+
+        Syntax: stats [reset]
+
+        - Lists the number of statements and the time they took for
+          each of the last 20 commands, the totals since start (or
+          "stats reset") and the slowest statements with parameters
+        - Times are to the first row of a query
+        - Statements are counted from the first "stats" on, or from the
+          start with --stats or --slow-query-log FILE (which logs slow
+          statements to a file)
+        """
+        if args not in ['', 'reset']:
+            print(STATS_SYNTAX)
+            self.failed = True
+        elif self.query_stats is None:
+            self.query_stats = querystats.start(self.stats_args)
+            print(STATS_STARTED)
+        elif args == 'reset':
+            self.query_stats.reset()
+            print(STATS_RESET)
+        else:
+            self.query_stats.print_report()
+
+    def do_maintain(self, args):
+        """Purge old deleted tasks and tidy up the database
+
+        Syntax: maintain [days]
+
+        - Deletes tasks that were deleted (priority 9) more than [days]
+          ago (default: 30) with their history, and any duplicate open
+          history items
+        - Then updates the query planner statistics, frees unused
+          space and checks the database's integrity
+        - Prints the time each step took and the space reclaimed
+        - Also available as todo.py --maintain [DAYS]
+        """
+        if not args:
+            days = util.PURGE_DAYS_DEFAULT
+        elif args.isdigit():
+            days = int(args)
+        else:
+            print(MAINTAIN_SYNTAX)
+            self.failed = True
+            return
+        self.failed = not maintain(days)
+
+    def do_search(self, args):
+        """Find tasks by words in their name, note or history notes
+
+        Syntax: search <terms> [--limit N] [--offset N] [--page]
+
+        - Lists the tasks (not deleted ones) that contain all the
+          terms, best matches first: matches in the task's name or
+          note come before matches in its (archived) history notes
+        - Quote a term to search for a phrase, e.g.
+          search "corner shop" milk
+        - Shows the first 20 matches unless --limit is given; see
+          "help list" for the paging options
+        """
+        self.failed = not views.search_tasks(args)
+
+    def do_archive(self, args):
+        """Move old done history to the archive
+
+        Syntax: archive [days]
+
+        - Moves history done before [days] ago (default: 365) out of
+          the table that list, next, due and done work on, so they
+          stay fast however long the history gets
+        - Archived history shows with "history <task> --archived" and
+          in todo.py --export --archived
+        """
+        if not args:
+            days = ARCHIVE_DAYS_DEFAULT
+        elif args.isdigit():
+            days = int(args)
+        else:
+            print(ARCHIVE_SYNTAX)
+            self.failed = True
+            return
+        archive_task_instances(days)
 
     def do_quit(self, arg):
         """Exit the program"""
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import re
+from ConfigParser import Error, RawConfigParser
+from collections import OrderedDict
+
+PROFILE_DEFAULT = 'default'
+PROFILE_FAST = 'fast'
+
+# pragmas set on every connection; "default" keeps sqlite's own
+# (rollback journal, full sync; python's sqlite3 already waits 5s for
+# locks), "fast" is what we run in production: write ahead log, sync
+# only at checkpoints, 64MB page cache, 256MB memory mapped i/o, temp
+# tables in memory and a 5s wait for locks
+PRAGMA_PROFILES = {
+    PROFILE_DEFAULT: [],
+    PROFILE_FAST: [
+        ('journal_mode', 'wal'),
+        ('synchronous', 'normal'),
+        ('cache_size', -64000),
+        ('mmap_size', 268435456),
+        ('temp_store', 'memory'),
+        ('busy_timeout', 5000),
+    ],
+}
+PRAGMA_NAMES = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+                'temp_store', 'busy_timeout']
+
+# Example ~/.todo.ini (any of PRAGMA_NAMES overrides the profile):
+#
+#     [database]
+#     profile = fast
+#     cache_size = -200000
+
+CONFIG_FILE_DEFAULT = os.path.expanduser('~/.todo.ini')
+CONFIG_SECTION = 'database'
+CONFIG_ERROR = '*** Config file error: '
+UNKNOWN_PROFILE = '*** Unknown database profile: '
+INVALID_PRAGMA_VALUE = '*** Invalid value for {pragma}: {value}'
+
+
+def get_pragmas(args):
+    """
+    :param args: parsed command line args (db_profile and config)
+    :return: list of (pragma, value) for models.init_database
+    """
+    config = RawConfigParser()
+    try:
+        config.read(args.config if args.config else CONFIG_FILE_DEFAULT)
+    except Error as e:
+        print(CONFIG_ERROR + str(e).splitlines()[0])
+        return PRAGMA_PROFILES[PROFILE_DEFAULT]
+
+    def get_option(option):
+        if config.has_option(CONFIG_SECTION, option):
+            return config.get(CONFIG_SECTION, option).strip()
+        return None
+
+    profile = args.db_profile or get_option('profile') or PROFILE_DEFAULT
+    if profile not in PRAGMA_PROFILES:
+        print(UNKNOWN_PROFILE + profile)
+        profile = PROFILE_DEFAULT
+
+    pragmas = OrderedDict(PRAGMA_PROFILES[profile])
+    for pragma in PRAGMA_NAMES:
+        value = get_option(pragma)
+        if value is None:
+            continue
+        # values end up in the PRAGMA statement as is
+        if not re.match(r'^-?\w+$', value):
+            print(INVALID_PRAGMA_VALUE.format(pragma=pragma, value=value))
+            continue
+        pragmas[pragma] = value
+
+    return list(pragmas.items())
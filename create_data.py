@@ -1,78 +1,385 @@
 #!/usr/bin/env python
 
+"""
+Create a todo database full of made up tasks and history, e.g. for
+load testing:
+
+    create_data.py --tasks 100000 --instances 100 --jobs 8 big.sqlite
+
+Same arguments (including --seed, but whatever --jobs) give the same
+database.
+"""
+
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import argparse
+import multiprocessing
 import os
-from datetime import datetime
-
-from models import Task, TaskInstance, db
-
-db_name = 'todo.sqlite'
-
-db.init(db_name)
-
-if os.path.exists(db_name):
-    os.remove(db_name)
-
-db.create_tables([Task, TaskInstance])
-db.connect()
-
-
-def create_task(name, note, priority):
-    return Task.create(name=name, note=note, priority=priority)
-
-
-pencils = create_task(
-    name='sharpen pencils', note='pencil note', priority=2
-)
-toenails = create_task(
-    name='clip toenails', note='clip toenails', priority=1
-)
-wool = create_task(name='gather wool', note=None, priority=1)
-just = create_task(name='just do it', note='bo knows', priority=4)
-dragon = create_task(
-    name='slay dragon',
-    note='remember bow and arrow',
-    priority=2
-)
-fret = create_task(name='fret', note='', priority=2)
-goner = create_task(name='goner', note="'tis deleted", priority=9)
-
-
-def create_instance(task, note, due, done=None):
-    return TaskInstance.create(task=task, note=note, due=due, done=done)
-
-
-create_instance(pencils, 'glirb', datetime(2016, 10, 1))
-create_instance(pencils, '', datetime(2016, 10, 2))
-create_instance(
-    pencils, 'finally',
-    datetime(2016, 10, 2, 15, 31),
-    datetime(2016, 10, 2, 17, 45)
-)
-create_instance(pencils, None, datetime(2016, 10, 3))
-create_instance(pencils, 'pencilled in', datetime(2016, 10, 5))
-
-create_instance(
-    wool, 'yuuuuuge', datetime(2016, 9, 21), datetime(2016, 9, 27)
-)
-create_instance(
-    wool, 'tracts', datetime(2016, 9, 21), datetime(2016, 8, 15)
-)
-create_instance(
-    wool, 'land', datetime(2016, 9, 21), datetime(2014, 3, 2)
-)
-create_instance(wool, 'open', datetime(2016, 10, 8))
-
-create_instance(
-    just, 'just think about it', datetime(2016, 10, 7, 5, 5)
-)
-create_instance(just, None, datetime(2016, 8, 1, 2, 3))
-create_instance(just, None, datetime(2016, 7, 6, 7, 8))
-
-create_instance(
-    fret, None, datetime(2016, 10, 11), datetime(2016, 10, 11)
-)
-
-db.close()
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import util
+from models import (TaskInstance, create_database, create_search_triggers,
+                    db, drop_search_triggers, get_search_module,
+                    init_database, rebuild_search_index)
+
+DB_NAME_DEFAULT = 'todo.sqlite'
+PRIORITY_MIX_DEFAULT = '1:30,2:30,3:20,4:15,9:5'
+ROWS_PER_TRANSACTION = 100000
+SECONDS_PER_DAY = 24 * 60 * 60
+NUM_NOTES = 200
+TASK_NAME = 'task {num:07d}'
+TASKS_PER_SEED = 1000
+SEED_MULTIPLIER = 1000003
+
+# fine for a file that is thrown away if anything goes wrong
+GENERATOR_PRAGMAS = [
+    ('journal_mode', 'memory'),
+    ('synchronous', 'off'),
+    ('cache_size', -64000),
+]
+
+NOTE_WORDS = ['pencil', 'wool', 'dragon', 'toenails', 'mountain', 'yak',
+              'finally', 'phew!', 'again', 'rocky', 'later', 'bo knows']
+
+CREATED = 'Created {tasks} tasks ({instances} history items) in {seconds:.1f}s'
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]  # pragma: no cover
+
+    args = get_args(argv)
+    priorities = parse_priority_mix(args.priorities)
+    if priorities is None:
+        return
+
+    if os.path.exists(args.database):
+        os.remove(args.database)
+
+    start = time.time()
+    tasks, instances = create_data(
+        args.database,
+        num_tasks=args.tasks,
+        instances_per_task=args.instances,
+        priorities=priorities,
+        open_ratio=args.open_ratio,
+        days=args.days,
+        seed=args.seed,
+        jobs=args.jobs
+    )
+    print(CREATED.format(
+        tasks=tasks,
+        instances=instances,
+        seconds=time.time() - start
+    ))
+
+
+def get_args(args):
+    parser = argparse.ArgumentParser(prog='create_data.py')
+
+    parser.add_argument(
+        'database',
+        type=str, nargs='?', default=DB_NAME_DEFAULT,
+        help='database file, replaced if it exists (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-t', '--tasks',
+        type=int, default=10, metavar='N',
+        help='number of tasks (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-i', '--instances',
+        type=int, default=5, metavar='N',
+        help='history items per task (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-p', '--priorities',
+        type=str, default=PRIORITY_MIX_DEFAULT, metavar='MIX',
+        help='priority:weight list (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-o', '--open-ratio',
+        type=float, default=0.5, metavar='RATIO',
+        help='share of tasks whose latest history item is still open '
+             '(default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '--days',
+        type=int, default=5 * 365, metavar='N',
+        help='history goes back this many days (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-s', '--seed',
+        type=int, default=0,
+        help='random seed (default: %(default)s)'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int, default=1, metavar='N',
+        help='build this many shards in parallel, then merge them '
+             '(default: %(default)s)'
+    )
+
+    return parser.parse_args(args)
+
+
+def parse_priority_mix(mix):
+    """
+    :param mix: e.g. '1:30,2:70' for 30% priority 1 and 70% priority 2
+    :return: None (invalid), or list of (priority, weight)
+    """
+    priorities = []
+    try:
+        for item in mix.split(','):
+            priority, weight = item.split(':')
+            if not util.valid_priority_number(priority):
+                return None
+            priorities.append((int(priority), float(weight)))
+    except ValueError:
+        print('*** Invalid priority mix: ' + mix)
+        return None
+    return priorities
+
+
+def create_data(db_file, num_tasks, instances_per_task, priorities,
+                open_ratio=0.5, days=365, seed=0, now=None, jobs=1):
+    """
+    Write num_tasks tasks with instances_per_task history items each;
+    rows go in with executemany, ROWS_PER_TRANSACTION per transaction.
+    With jobs > 1 the rows are written to that many shard files in
+    parallel, which are then merged into db_file (same result).
+
+    :return: (number of tasks, number of history items)
+    """
+    settings = (
+        instances_per_task,
+        priorities,
+        open_ratio,
+        days,
+        seed,
+        now if now else datetime.now().replace(microsecond=0)
+    )
+
+    init_database(db_file, GENERATOR_PRAGMAS)
+    db.connect()
+    create_database()
+
+    # the search index is built in one go once the rows are in, which
+    # is many times faster than its triggers doing it row by row
+    search_index = get_search_module() is not None
+    if search_index:
+        drop_search_triggers()
+
+    if jobs <= 1:
+        _write_rows(db.get_conn(), _iter_rows(1, num_tasks + 1, *settings))
+    else:
+        _create_shards(db_file, num_tasks, jobs, settings)
+
+    if search_index:
+        with db.atomic():
+            rebuild_search_index()
+            create_search_triggers()
+
+    num_instances = TaskInstance.select().count()
+    db.close()
+
+    return num_tasks, num_instances
+
+
+def _create_shards(db_file, num_tasks, jobs, settings):
+    shards = []
+    # whole TASKS_PER_SEED blocks per shard (see _iter_rows)
+    blocks = -(-num_tasks // TASKS_PER_SEED)  # rounded up
+    per_shard = -(-blocks // jobs) * TASKS_PER_SEED
+    for first_id in range(1, num_tasks + 1, per_shard):
+        shard_file = '{db_file}.shard{num}'.format(
+            db_file=db_file,
+            num=len(shards)
+        )
+        last_id = min(first_id + per_shard, num_tasks + 1)
+        shards.append((shard_file, first_id, last_id, settings))
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pool.map(_create_shard, shards)
+    finally:
+        pool.close()
+        pool.join()
+
+    # shards hold consecutive id ranges, so this appends in id order
+    for shard_file, _, _, _ in shards:
+        db.execute_sql('ATTACH DATABASE ? AS shard', (shard_file,))
+        with db.atomic():
+            db.execute_sql(
+                'INSERT INTO task (id, name, note, priority, deleted) '
+                'SELECT * FROM shard.task'
+            )
+            db.execute_sql(
+                'INSERT INTO taskinstance (id, task_id, note, due, done) '
+                'SELECT * FROM shard.taskinstance'
+            )
+        db.execute_sql('DETACH DATABASE shard')
+        os.remove(shard_file)
+
+
+def _create_shard(shard):
+    """ runs in a worker process: write one id range to its own file """
+    shard_file, first_id, last_id, settings = shard
+    if os.path.exists(shard_file):
+        os.remove(shard_file)
+
+    conn = sqlite3.connect(shard_file, isolation_level=None)
+    for pragma, value in GENERATOR_PRAGMAS:
+        conn.execute('PRAGMA {pragma} = {value}'.format(
+            pragma=pragma,
+            value=value
+        ))
+    # same columns (in the same order) as the real tables, no indexes
+    conn.execute('CREATE TABLE task (id, name, note, priority, deleted)')
+    conn.execute('CREATE TABLE taskinstance (id, task_id, note, due, done)')
+    _write_rows(conn, _iter_rows(first_id, last_id, *settings))
+    conn.close()
+
+
+def _write_rows(conn, rows):
+    cursor = conn.cursor()
+    tasks = []
+    instances = []
+    for task, task_instances in rows:
+        tasks.append(task)
+        instances.extend(task_instances)
+        if len(tasks) + len(instances) >= ROWS_PER_TRANSACTION:
+            _insert_rows(cursor, tasks, instances)
+            tasks = []
+            instances = []
+
+    _insert_rows(cursor, tasks, instances)
+
+
+def _insert_rows(cursor, tasks, instances):
+    cursor.execute('BEGIN')
+    cursor.executemany(
+        'INSERT INTO task (id, name, note, priority, deleted) '
+        'VALUES (?, ?, ?, ?, ?)',
+        tasks
+    )
+    cursor.executemany(
+        'INSERT INTO taskinstance (id, task_id, note, due, done) '
+        'VALUES (?, ?, ?, ?, ?)',
+        instances
+    )
+    cursor.execute('COMMIT')
+
+
+def _iter_rows(first_id, last_id, instances_per_task, priorities,
+               open_ratio, days, seed, now):
+    """
+    yield (task row, list of its instance rows) for task ids first_id
+    up to (not including) last_id. History ids follow from task ids
+    and every TASKS_PER_SEED tasks get their own random sequence, so a
+    range comes out the same whichever way the work is split (first_id
+    must be 1 more than a multiple of TASKS_PER_SEED).
+    """
+    priority_values = [p for p, _ in priorities]
+    cumulative_weights = []
+    total = 0
+    for _, weight in priorities:
+        total += weight
+        cumulative_weights.append(total)
+
+    notes = _get_notes(random.Random(seed))
+    num_notes = len(notes)
+    fmt = _DateTimeFormatter(now - timedelta(days=days))
+
+    span_seconds = days * SECONDS_PER_DAY
+    now_seconds = span_seconds + fmt.time_of_day
+    # done dates spread evenly over the span, with some jitter
+    step = span_seconds // (instances_per_task + 1)
+    jitter = step // 2
+
+    for task_id in range(first_id, last_id):
+        if (task_id - 1) % TASKS_PER_SEED == 0:
+            rand = random.Random(
+                seed * SEED_MULTIPLIER + (task_id - 1) // TASKS_PER_SEED
+            ).random
+
+        priority = priority_values[_pick(rand(), cumulative_weights, total)]
+        note = notes[int(rand() * num_notes)] if rand() < 0.3 else None
+        # deleted some time in the span, for maintain to purge
+        deleted = fmt(int(rand() * now_seconds)) \
+            if priority == util.PRIORITY_DELETED else None
+        task = (task_id, TASK_NAME.format(num=task_id), note, priority,
+                deleted)
+
+        is_open = rand() < open_ratio
+        instances = []
+        instance_id = (task_id - 1) * instances_per_task
+        for n in range(instances_per_task):
+            instance_id += 1
+            note = notes[int(rand() * num_notes)] if rand() < 0.3 else None
+            if n == instances_per_task - 1 and is_open:
+                due = now_seconds + int(rand() * 38 - 7) * SECONDS_PER_DAY
+                done = None
+            else:
+                due = fmt.time_of_day + step * (n + 1) - int(rand() * jitter)
+                done = fmt(due + int(rand() * jitter))
+            instances.append((instance_id, task_id, note, fmt(due), done))
+
+        yield task, instances
+
+
+def _pick(r, cumulative_weights, total):
+    r *= total
+    for i, weight in enumerate(cumulative_weights):
+        if r < weight:
+            return i
+    return len(cumulative_weights) - 1
+
+
+def _get_notes(rand):
+    # a fixed set of notes to pick from (most history has no note at all)
+    return [' '.join(rand.sample(NOTE_WORDS, rand.randint(1, 3)))
+            for _ in range(NUM_NOTES)]
+
+
+class _DateTimeFormatter(object):
+    """
+    Formats a number of seconds after the start of the span the way
+    util.get_datetime_string does, but from cached date and time of day
+    strings rather than with strftime, which would take most of the
+    generator's time.
+    """
+
+    def __init__(self, start):
+        self.midnight = datetime(start.year, start.month, start.day)
+        self.time_of_day = int((start - self.midnight).total_seconds())
+        self.dates = {}
+        self.times = ['{h:02d}:{m:02d}:{s:02d}'.format(h=s // 3600,
+                                                      m=s // 60 % 60,
+                                                      s=s % 60)
+                      for s in range(SECONDS_PER_DAY)]
+
+    def __call__(self, seconds):
+        day, seconds = divmod(seconds, SECONDS_PER_DAY)
+        date = self.dates.get(day)
+        if date is None:
+            date = (self.midnight + timedelta(days=day)).strftime('%Y-%m-%d')
+            self.dates[day] = date
+        return date + ' ' + self.times[seconds]
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
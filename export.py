@@ -4,38 +4,136 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import json
+import sys
+
+from peewee import JOIN, SQL
 
 import util
-from models import Task, TaskInstance, db
+from models import Task, TaskInstance, TaskInstanceArchive, db, init_database
 
+JSON_INDENT = 4
+# explicit, so that the streamed output stays the same as the list's
+# (the default with indent differs between Python 2 and 3)
+JSON_SEPARATORS = (', ', ': ')
+NDJSON_SEPARATORS = (',', ':')
 
-def export_to_json(db_file):
 
-    db.init(db_file)
+def export_to_json(db_file, stream=False, ndjson=False, output=None,
+                   pragmas=None, archived=False):
+    """
+    :param db_file: todo database to export
+    :param stream: write each task as soon as it is read rather than
+                   building the whole list first (same output)
+    :param ndjson: write one compact json task object per line
+                   (always streamed)
+    :param output: file name to write to instead of stdout
+    :param pragmas: sqlite pragmas for the connection (see config.py)
+    :param archived: include the archived history (see archive.py)
+    """
+    init_database(db_file, pragmas)
     db.connect()
 
-    tasks = []
-    for task in Task.select().order_by(Task.name):
-        task_dict = {
-            'name': task.name,
-            'priority': task.priority,
-            'note': task.note if task.note else '',
-        }
-        instances = []
-        for inst in (TaskInstance.select()
-                                 .join(Task)
-                                 .where(TaskInstance.task == task)
-                                 .order_by(TaskInstance.done)):
-            inst_dict = {
-                'due': util.get_datetime_string(inst.due),
-                'done': util.get_datetime_string(inst.done),
-                'note': inst.note if inst.note else '',
+    out = open(output, 'w') if output else sys.stdout
+    try:
+        # a database that was never upgraded has no archive
+        tasks = _iter_tasks(
+            archived=archived and TaskInstanceArchive.table_exists()
+        )
+        if ndjson:
+            _write_ndjson(tasks, out)
+        elif stream:
+            _write_json_stream(tasks, out)
+        else:
+            out.write(json.dumps(list(tasks), indent=JSON_INDENT,
+                                 separators=JSON_SEPARATORS) + '\n')
+    finally:
+        if output:
+            out.close()
+        db.close()
+
+
+def _write_json_stream(tasks, out):
+    # reproduces the json.dumps of the whole list one task at a time
+    newline = '\n' + ' ' * JSON_INDENT
+    separator = '['
+    for task in tasks:
+        task_json = json.dumps(task, indent=JSON_INDENT,
+                               separators=JSON_SEPARATORS)
+        out.write(separator + newline + task_json.replace('\n', newline))
+        separator = JSON_SEPARATORS[0]
+    out.write('[]\n' if separator == '[' else '\n]\n')
+
+
+def _write_ndjson(tasks, out):
+    for task in tasks:
+        out.write(json.dumps(task, separators=NDJSON_SEPARATORS) + '\n')
+
+
+def _iter_tasks(archived=False):
+    """ yield task dicts (with history) one at a time, in name order """
+
+    # one ordered query for all tasks and their history, grouped as we
+    # go (left join so that tasks without history are still exported);
+    # iterator() so that rows aren't cached as we walk the cursor
+    query = (Task
+             .select(
+                Task.id,
+                Task.name,
+                Task.priority,
+                Task.note,
+                TaskInstance.due,
+                TaskInstance.done,
+                TaskInstance.note,
+                TaskInstance.id.alias('instance_id')
+             )
+             .join(TaskInstance, JOIN.LEFT_OUTER))
+
+    if archived:
+        # archived history goes in with the rest, by done date
+        query = query.union_all(
+            Task
+            .select(
+                Task.id,
+                Task.name,
+                Task.priority,
+                Task.note,
+                TaskInstanceArchive.due,
+                TaskInstanceArchive.done,
+                TaskInstanceArchive.note,
+                TaskInstanceArchive.id
+            )
+            .join(TaskInstanceArchive)
+        )
+
+    # by result column, which is all a union can be ordered by
+    query = (query
+             .order_by(SQL('name'), SQL('done'), SQL('instance_id'))
+             .tuples())
+
+    task = None
+    task_id = None
+    for (row_task_id, name, priority, note,
+         inst_due, inst_done, inst_note, _) in query.iterator():
+
+        if row_task_id != task_id:
+            if task is not None:
+                yield task
+            task_id = row_task_id
+            task = {
+                'name': name,
+                'priority': priority,
+                'note': note if note else '',
+                'history': [],
             }
-            instances.append(inst_dict)
 
-        task_dict['history'] = instances
-        tasks.append(task_dict)
+        if inst_due is None:  # task without any history
+            continue
 
-    db.close()
+        task['history'].append({
+            'due': util.get_datetime_string(inst_due),
+            'done': util.get_datetime_string(inst_done),
+            'note': inst_note if inst_note else '',
+        })
 
-    print(json.dumps(tasks, indent=4))
+    if task is not None:
+        yield task
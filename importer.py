@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+from peewee import IntegrityError, fn
+
+import util
+from models import Task, create_database, db, init_database, upgrade_database
+
+IMPORT_BATCH_SIZE = 10000  # rows per transaction
+READ_CHUNK_SIZE = 64 * 1024
+# util.DATETIME_FORMAT, as export writes it and the database stores it
+DATETIME_PATTERN = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$')
+
+INSERT_TASK = ('INSERT INTO task (id, name, note, priority, deleted) '
+               'VALUES (?, ?, ?, ?, ?)')
+INSERT_TASK_INSTANCE = ('INSERT INTO taskinstance (task_id, note, due, done) '
+                        'VALUES (?, ?, ?, ?)')
+
+IMPORTED = 'Imported {tasks} tasks ({instances} history items)'
+IMPORT_FILE_NOT_FOUND = 'Import file not found: '
+IMPORT_INVALID = '*** Invalid import file: '
+IMPORT_STOPPED = '*** Import stopped: '
+
+
+def import_from_json(db_file, json_file, pragmas=None):
+    """
+    Load tasks and history in the format written by export_to_json
+    (a json array or one task object per line) into db_file, which is
+    created if it doesn't exist yet.
+
+    :param json_file: file name, or '-' for stdin
+    :param pragmas: sqlite pragmas for the connection (see config.py)
+    """
+    if json_file != '-' and not os.path.exists(json_file):
+        print(IMPORT_FILE_NOT_FOUND + json_file)
+        return
+
+    new_database = not os.path.exists(db_file)
+    init_database(db_file, pragmas)
+    db.connect()
+    if new_database:
+        create_database()
+    else:
+        upgrade_database()
+
+    if json_file == '-':
+        f = io.open(sys.stdin.fileno(), encoding='utf-8', closefd=False)
+    else:
+        f = io.open(json_file, encoding='utf-8')
+
+    importer = _BatchImporter()
+    try:
+        for task in _iter_json_objects(f):
+            importer.add(task)
+        importer.flush()
+    except (ValueError, KeyError, TypeError) as e:
+        print(IMPORT_INVALID + _error_message(e))
+    except IntegrityError as e:
+        print(IMPORT_STOPPED + _error_message(e))
+    finally:
+        f.close()
+        db.close()
+
+    print(IMPORTED.format(
+        tasks=importer.tasks_imported,
+        instances=importer.instances_imported
+    ))
+
+
+def _error_message(e):
+    return e.args[0] if e.args else e.__class__.__name__
+
+
+class _BatchImporter(object):
+    """
+    Collects task and history rows (as tuples in INSERT_TASK and
+    INSERT_TASK_INSTANCE column order) and writes them with executemany,
+    one transaction per batch. Task ids are assigned here so that
+    history rows can refer to them without reading them back.
+    """
+
+    def __init__(self):
+        max_id = Task.select(fn.Max(Task.id)).scalar()
+        self.next_task_id = (max_id or 0) + 1
+        # deleted tasks count as deleted when they were imported
+        self.now = datetime.now().replace(microsecond=0)
+        self.tasks = []
+        self.instances = []
+        self.tasks_imported = 0
+        self.instances_imported = 0
+
+    def add(self, task):
+        task_id = self.next_task_id
+        self.next_task_id += 1
+        priority = int(task['priority'])
+        self.tasks.append((
+            task_id,
+            task['name'],
+            task['note'] if task['note'] else None,
+            priority,
+            self.now if priority == util.PRIORITY_DELETED else None,
+        ))
+        instances = [(
+            task_id,
+            inst['note'] if inst['note'] else None,
+            _check_datetime(inst['due']),
+            _check_datetime(inst['done']),
+        ) for inst in task['history']]
+        self.instances.extend(_collapse_open_instances(instances))
+
+        if len(self.tasks) + len(self.instances) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.tasks:
+            return
+
+        with db.atomic(), db.exception_wrapper():
+            cursor = db.get_conn().cursor()
+            cursor.executemany(INSERT_TASK, self.tasks)
+            cursor.executemany(INSERT_TASK_INSTANCE, self.instances)
+
+        self.tasks_imported += len(self.tasks)
+        self.instances_imported += len(self.instances)
+        self.tasks = []
+        self.instances = []
+
+
+def _collapse_open_instances(instances):
+    """
+    Older databases (and so their exports) can have more than one open
+    instance per task: keep the one with the latest due date (the last
+    one on a tie), as models.collapse_open_task_instances does.
+    """
+    # (task_id, note, due, done): the dates are strings in
+    # DATETIME_FORMAT, so they compare in date order
+    open_instances = [inst for inst in instances if inst[3] is None]
+    if len(open_instances) < 2:
+        return instances
+
+    # max returns the first of equal keys, so look from the end
+    latest = max(reversed(open_instances), key=lambda inst: inst[2])
+    return [inst for inst in instances
+            if inst[3] is not None or inst is latest]
+
+
+def _check_datetime(s):
+    """
+    Dates are inserted as the strings they are, which only needs them
+    to be in util.DATETIME_FORMAT: a pattern match rather than strptime.
+    """
+    if not s:
+        return None
+    if not DATETIME_PATTERN.match(s):
+        raise ValueError('invalid date: ' + s)
+    return s
+
+
+def _iter_json_objects(f):
+    """
+    Yield the objects of a json array (or of newline delimited json)
+    one at a time, reading the file in chunks rather than all at once.
+    """
+    decoder = json.JSONDecoder()
+    separators = ' \t\r\n[],'
+    buf = ''
+    eof = False
+    while True:
+        buf = buf.lstrip(separators)
+        if buf:
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                if not isinstance(obj, dict):
+                    raise ValueError('expected a task object')
+                yield obj
+                buf = buf[end:]
+                continue
+        elif eof:
+            return
+
+        # incomplete object: read more (at least as much as we have,
+        # so that large objects aren't re-parsed over and over)
+        chunk = f.read(max(READ_CHUNK_SIZE, len(buf)))
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import time
+from datetime import datetime, timedelta
+
+from models import (Task, TaskInstance, TaskInstanceArchive,
+                    collapse_open_task_instances, db)
+from util import PRIORITY_DELETED, PURGE_DAYS_DEFAULT
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+MAINTAIN_HEADER = 'step                ms  result'
+MAINTAIN_LINE = '{step:10} {ms:11.3f}  {result}'
+MAINTAIN_TOTAL = ('Total: {ms:.3f} ms, {before} -> {after} KB '
+                  '({reclaimed} KB reclaimed)')
+PURGED = '{tasks} tasks, {instances} history items'
+COLLAPSED = '{instances} open history items'
+VACUUMED = '{pages} pages'
+VACUUM_SKIPPED = 'skipped (in a transaction)'
+INTEGRITY_FAILED = '*** Integrity check failed: '
+
+
+def maintain(purge_days=PURGE_DAYS_DEFAULT, now=None):
+    """
+    Tidy up a long-lived database, printing how long each step took:
+
+    - purge: tasks deleted more than purge_days ago, with their
+      (archived) history, and history whose task is gone
+    - collapse: duplicate open instances (see
+      models.collapse_open_task_instances)
+    - analyze and optimize: planner statistics
+    - vacuum: free pages, incrementally if the database allows it
+      (auto_vacuum = incremental), by rebuilding it otherwise
+    - integrity: sqlite's integrity_check
+
+    The total shows the size before and after, and what vacuum freed
+    (analyze adds a statistics table, so the difference can be less).
+
+    Purge and collapse are set-based deletes: a statement or two
+    however many rows they remove.
+
+    :return: True if the integrity check passed
+    """
+    cutoff = (now if now else datetime.now()) - timedelta(days=purge_days)
+    size_before = _get_size()
+    start = time.time()
+
+    print(MAINTAIN_HEADER)
+    _run_step('purge', _purge_deleted_tasks, cutoff)
+    _run_step('collapse', _collapse)
+    _run_step('analyze', _execute, 'ANALYZE')
+    _run_step('optimize', _execute, 'PRAGMA optimize')
+    pages_before_vacuum = _get_pragma('page_count')
+    _run_step('vacuum', _vacuum)
+    reclaimed = ((pages_before_vacuum - _get_pragma('page_count')) *
+                 _get_pragma('page_size'))
+    errors = _run_step('integrity', _check_integrity)
+
+    size_after = _get_size()
+    print(MAINTAIN_TOTAL.format(
+        ms=(time.time() - start) * 1000,
+        before=size_before // 1024,
+        after=size_after // 1024,
+        reclaimed=reclaimed // 1024
+    ))
+
+    for error in errors:
+        print(INTEGRITY_FAILED + error)
+    return not errors
+
+
+def _run_step(step, func, *args):
+    start = time.time()
+    result = func(*args)
+    print(MAINTAIN_LINE.format(
+        step=step,
+        ms=(time.time() - start) * 1000,
+        result=_format_result(result)
+    ))
+    return result
+
+
+def _format_result(result):
+    if isinstance(result, list):
+        # integrity check errors
+        return '{} errors'.format(len(result)) if result else 'ok'
+    return result
+
+
+def _execute(sql):
+    db.execute_sql(sql)
+    return ''
+
+
+def _purge_deleted_tasks(cutoff):
+    deleted_tasks = (Task
+                     .select(Task.id)
+                     .where(
+                        Task.priority == PRIORITY_DELETED,
+                        Task.deleted < cutoff
+                      ))
+
+    with db.atomic():
+        instances = (TaskInstance
+                     .delete()
+                     .where(
+                        (TaskInstance.task << deleted_tasks) |
+                        ~(TaskInstance.task << Task.select(Task.id))
+                      )
+                     .execute())
+        # the task delete would cascade to these anyway, uncounted
+        instances += (TaskInstanceArchive
+                      .delete()
+                      .where(TaskInstanceArchive.task << deleted_tasks)
+                      .execute())
+        tasks = (Task
+                 .delete()
+                 .where(
+                    Task.priority == PRIORITY_DELETED,
+                    Task.deleted < cutoff
+                  )
+                 .execute())
+
+    return PURGED.format(tasks=tasks, instances=instances)
+
+
+def _collapse():
+    with db.atomic():
+        instances = collapse_open_task_instances()
+    return COLLAPSED.format(instances=instances)
+
+
+def _vacuum():
+    pages_before = _get_pragma('page_count')
+    if _get_pragma('auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+        # frees a page per step, so every row has to be fetched
+        db.execute_sql('PRAGMA incremental_vacuum').fetchall()
+    elif db.transaction_depth():
+        return VACUUM_SKIPPED
+    else:
+        db.execute_sql('VACUUM')
+    return VACUUMED.format(pages=pages_before - _get_pragma('page_count'))
+
+
+def _check_integrity():
+    """ :return: list of errors """
+    rows = db.execute_sql('PRAGMA integrity_check').fetchall()
+    return [row[0] for row in rows if row[0] != 'ok']
+
+
+def _get_size():
+    return _get_pragma('page_count') * _get_pragma('page_size')
+
+
+def _get_pragma(pragma):
+    return db.execute_sql('PRAGMA ' + pragma).fetchone()[0]
@@ -3,10 +3,65 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import os
+import time
+from datetime import datetime
+
 from peewee import (CharField, DateTimeField, ForeignKeyField, IntegerField,
-                    Model, SqliteDatabase)
+                    Model, OperationalError, SqliteDatabase)
+
+from util import PRIORITY_DELETED
+
+# only take effect before the first table is created (and, for
+# page_size, before the database is switched to the write ahead log)
+CREATE_PRAGMAS = [
+    ('page_size', 4096),
+    ('auto_vacuum', 'incremental'),
+]
+
+# on every connection, whatever the profile: deleting a task deletes
+# its history (on delete cascade)
+CONNECT_PRAGMAS = [
+    ('foreign_keys', 'on'),
+]
+
+
+class TodoDatabase(SqliteDatabase):
+
+    # querystats.QueryStats recording every statement, if any
+    query_stats = None
 
-db = SqliteDatabase(None)
+    def init(self, database, pragmas=None, **connect_kwargs):
+        self._pragmas = CONNECT_PRAGMAS + list(pragmas or [])
+        super(TodoDatabase, self).init(database, **connect_kwargs)
+
+    def execute_sql(self, sql, params=None, require_commit=True):
+        if self.query_stats is None:
+            return super(TodoDatabase, self).execute_sql(
+                sql, params, require_commit
+            )
+        start = time.time()
+        try:
+            return super(TodoDatabase, self).execute_sql(
+                sql, params, require_commit
+            )
+        finally:
+            self.query_stats.record(sql, params, time.time() - start)
+
+
+db = TodoDatabase(None)
+
+
+def init_database(db_file, pragmas=None):
+    """
+    :param pragmas: list of (name, value) pairs for every connection
+                    (see config.PRAGMA_PROFILES)
+    """
+    pragmas = list(pragmas or [])
+    if not os.path.exists(db_file):
+        # the first connection creates the file, so these go first
+        pragmas = CREATE_PRAGMAS + pragmas
+    db.init(db_file, pragmas=pragmas)
 
 
 class BaseModel(Model):
@@ -18,14 +73,289 @@ class Task(BaseModel):
     name = CharField(unique=True)
     note = CharField(null=True)
     priority = IntegerField()
+    # when priority was set to deleted, so that old ones can be purged
+    deleted = DateTimeField(null=True)
 
 
 class TaskInstance(BaseModel):
-    task = ForeignKeyField(Task, related_name='instances')
+    task = ForeignKeyField(Task, related_name='instances', on_delete='CASCADE')
     note = CharField(null=True)
     due = DateTimeField()
     done = DateTimeField(null=True)
 
 
+class TaskInstanceArchive(BaseModel):
+    """ done history moved out of TaskInstance (see archive.py) """
+    task = ForeignKeyField(Task, related_name='archived_instances',
+                           on_delete='CASCADE')
+    note = CharField(null=True)
+    due = DateTimeField()
+    done = DateTimeField()
+
+
 def create_database():
+    # CREATE_PRAGMAS are already set: init_database adds them to the
+    # connection's pragmas when the database file doesn't exist yet
     db.create_tables([Task, TaskInstance])
+    upgrade_database()
+
+
+def upgrade_database():
+    """
+    Bring an existing database up to date by running the migrations
+    it hasn't seen yet; sqlite's user_version pragma keeps track.
+    """
+    version = get_schema_version()
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        with db.atomic():
+            migration()
+            db.execute_sql('PRAGMA user_version = {number}'.format(
+                number=number
+            ))
+
+
+def get_schema_version():
+    return db.execute_sql('PRAGMA user_version').fetchone()[0]
+
+
+def _create_task_instance_indexes():
+    # history lookups filter on task and sort by done; open instance
+    # lookups (and the task list due date) only want done IS NULL rows
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS taskinstance_task_id_done '
+        'ON taskinstance (task_id, done)'
+    )
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS taskinstance_open_task_id_due '
+        'ON taskinstance (task_id, due) WHERE done IS NULL'
+    )
+
+
+def collapse_open_task_instances():
+    """
+    Keep each task's open instance with the latest due date (latest id
+    on a tie) and delete the rest, in one statement
+
+    :return: number of instances deleted
+    """
+    return db.execute_sql(
+        'DELETE FROM taskinstance '
+        'WHERE done IS NULL AND EXISTS ('
+        'SELECT 1 FROM taskinstance AS newer '
+        'WHERE newer.task_id = taskinstance.task_id '
+        'AND newer.done IS NULL '
+        'AND (newer.due > taskinstance.due OR '
+        '(newer.due = taskinstance.due AND newer.id > taskinstance.id)))'
+    ).rowcount
+
+
+def _enforce_one_open_task_instance():
+    # collapse the duplicates, then make sure there can't be more than
+    # one open instance again
+    collapse_open_task_instances()
+    db.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS taskinstance_open_task_id '
+        'ON taskinstance (task_id) WHERE done IS NULL'
+    )
+    # open instance lookups now find at most one row through either
+    # this or taskinstance_task_id_done
+    db.execute_sql('DROP INDEX IF EXISTS taskinstance_open_task_id_due')
+
+
+def _add_task_deleted_date():
+    # new databases already have the column (create_tables)
+    columns = [row[1] for row in db.execute_sql('PRAGMA table_info(task)')]
+    if 'deleted' not in columns:
+        db.execute_sql('ALTER TABLE task ADD COLUMN deleted DATETIME')
+    # tasks deleted before this was tracked count as deleted now
+    db.execute_sql(
+        'UPDATE task SET deleted = ? WHERE priority = ? AND deleted IS NULL',
+        (datetime.now().replace(microsecond=0), PRIORITY_DELETED)
+    )
+
+
+def _cascade_task_instance_delete():
+    # new databases already have it (create_tables)
+    if any(row[6] == 'CASCADE' for row in
+           db.execute_sql('PRAGMA foreign_key_list(taskinstance)')):
+        return
+
+    # sqlite can't alter a foreign key, so the table is rebuilt
+    index_sql = [sql for sql, in db.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'taskinstance' AND sql IS NOT NULL"
+    )]
+    db.execute_sql('ALTER TABLE taskinstance RENAME TO taskinstance_old')
+    db.create_table(TaskInstance)
+    # history of tasks that are already gone can't come along
+    db.execute_sql(
+        'INSERT INTO taskinstance (id, task_id, note, due, done) '
+        'SELECT id, task_id, note, due, done FROM taskinstance_old '
+        'WHERE task_id IN (SELECT id FROM task)'
+    )
+    db.execute_sql('DROP TABLE taskinstance_old')
+    for sql in index_sql:
+        db.execute_sql(sql)
+
+
+def _create_task_instance_archive():
+    db.create_table(TaskInstanceArchive, safe=True)
+    # for history, and the task_id lookups of the cascading delete
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS taskinstancearchive_task_id_done '
+        'ON taskinstancearchive (task_id, done)'
+    )
+
+
+# full text search over task names and notes and history notes (both
+# tables, keyed by their own ids), kept in sync by triggers
+SEARCH_MODULES = ['fts5', 'fts4']
+SEARCH_TABLES = {
+    'fts5': {
+        'task': '{table}_fts USING fts5(name, note)',
+        'history': '{table}_fts USING fts5(note, task_id UNINDEXED)',
+    },
+    'fts4': {
+        'task': '{table}_fts USING fts4(name, note)',
+        'history': '{table}_fts USING fts4(note, task_id, '
+                   'notindexed=task_id)',
+    },
+}
+SEARCH_TRIGGERS = {
+    'task': [
+        'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} '
+        'BEGIN '
+        'INSERT INTO {table}_fts (rowid, name, note) '
+        'VALUES (new.id, new.name, new.note); '
+        'END',
+        'CREATE TRIGGER {table}_fts_update '
+        'AFTER UPDATE OF name, note ON {table} '
+        'BEGIN '
+        'DELETE FROM {table}_fts WHERE rowid = old.id; '
+        'INSERT INTO {table}_fts (rowid, name, note) '
+        'VALUES (new.id, new.name, new.note); '
+        'END',
+        'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} '
+        'BEGIN '
+        'DELETE FROM {table}_fts WHERE rowid = old.id; '
+        'END',
+    ],
+    # history without a note isn't indexed
+    'history': [
+        'CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} '
+        'WHEN new.note IS NOT NULL '
+        'BEGIN '
+        'INSERT INTO {table}_fts (rowid, note, task_id) '
+        'VALUES (new.id, new.note, new.task_id); '
+        'END',
+        'CREATE TRIGGER {table}_fts_update AFTER UPDATE OF note ON {table} '
+        'BEGIN '
+        'DELETE FROM {table}_fts WHERE rowid = old.id; '
+        'INSERT INTO {table}_fts (rowid, note, task_id) '
+        'SELECT new.id, new.note, new.task_id WHERE new.note IS NOT NULL; '
+        'END',
+        'CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} '
+        'WHEN old.note IS NOT NULL '
+        'BEGIN '
+        'DELETE FROM {table}_fts WHERE rowid = old.id; '
+        'END',
+    ],
+}
+SEARCH_COLUMNS = {
+    'task': 'name, note',
+    'history': 'note, task_id',
+}
+SEARCH_INDEXED = [
+    ('task', 'task'),
+    ('taskinstance', 'history'),
+    ('taskinstancearchive', 'history'),
+]
+
+
+def get_search_module(database=db):
+    """ :return: 'fts5' or 'fts4' (the search index), or None """
+    row = database.execute_sql(
+        "SELECT sql FROM sqlite_master WHERE name = 'task_fts'"
+    ).fetchone()
+    if row is None:
+        return None
+    return 'fts5' if 'fts5' in row[0].lower() else 'fts4'
+
+
+def _get_available_search_module():
+    for module in SEARCH_MODULES:
+        try:
+            db.execute_sql(
+                'CREATE VIRTUAL TABLE temp.fts_probe USING {module}(x)'
+                .format(module=module)
+            )
+        except OperationalError:  # no such module
+            continue
+        db.execute_sql('DROP TABLE temp.fts_probe')
+        return module
+    return None
+
+
+def rebuild_search_index():
+    """ fill the search index from scratch, a statement per table """
+    for table, kind in SEARCH_INDEXED:
+        db.execute_sql('DELETE FROM {table}_fts'.format(table=table))
+        db.execute_sql(
+            'INSERT INTO {table}_fts (rowid, {columns}) '
+            'SELECT id, {columns} FROM {table}{where}'.format(
+                table=table,
+                columns=SEARCH_COLUMNS[kind],
+                where=' WHERE note IS NOT NULL' if kind == 'history' else ''
+            )
+        )
+
+
+def create_search_triggers():
+    for table, kind in SEARCH_INDEXED:
+        for trigger in SEARCH_TRIGGERS[kind]:
+            db.execute_sql(trigger.format(table=table))
+
+
+def drop_search_triggers():
+    """ for bulk loads: rebuild_search_index, create_search_triggers """
+    for table, _ in SEARCH_INDEXED:
+        for event in ['insert', 'update', 'delete']:
+            db.execute_sql(
+                'DROP TRIGGER IF EXISTS {table}_fts_{event}'.format(
+                    table=table,
+                    event=event
+                )
+            )
+
+
+def _create_search_index():
+    # without either module, search falls back to LIKE scans
+    module = _get_available_search_module()
+    if module is None:
+        return
+
+    for table, kind in SEARCH_INDEXED:
+        db.execute_sql('CREATE VIRTUAL TABLE ' +
+                       SEARCH_TABLES[module][kind].format(table=table))
+    rebuild_search_index()
+    create_search_triggers()
+
+
+def _create_open_due_index():
+    # next reads open instances in due order, as many as it shows
+    db.execute_sql(
+        'CREATE INDEX IF NOT EXISTS taskinstance_open_due '
+        'ON taskinstance (due) WHERE done IS NULL'
+    )
+
+
+# append only: a database at schema version n has run the first n
+MIGRATIONS = [
+    _create_task_instance_indexes,
+    _enforce_one_open_task_instance,
+    _add_task_deleted_date,
+    _cascade_task_instance_delete,
+    _create_task_instance_archive,
+    _create_search_index,
+    _create_open_due_index,
+]
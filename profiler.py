@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import cProfile
+import pstats
+import sys
+
+PROFILE_TOP = 20  # functions shown after each command
+PROFILE_SAVED = 'Profile saved: {file}'
+
+
+class CommandProfiler(object):
+    """
+    Runs commands under cProfile, either printing the top cumulative
+    hotspots after each one or, given an output file, collecting all of
+    them into one profile that close() writes for offline analysis
+    (python -m pstats FILE).
+    """
+
+    def __init__(self, output_file=None, top=PROFILE_TOP):
+        self.output_file = output_file
+        self.top = top
+        self.profile = cProfile.Profile() if output_file else None
+
+    def run(self, func, *args):
+        profile = self.profile if self.profile else cProfile.Profile()
+        try:
+            return profile.runcall(func, *args)
+        finally:
+            if not self.output_file:
+                self.print_stats(profile)
+
+    def print_stats(self, profile):
+        stats = pstats.Stats(profile, stream=sys.stdout)
+        stats.sort_stats('cumulative').print_stats(self.top)
+
+    def close(self):
+        if self.output_file:
+            self.profile.dump_stats(self.output_file)
+            print(PROFILE_SAVED.format(file=self.output_file))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import heapq
+import io
+import json
+import sys
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+SLOW_MS_DEFAULT = 100
+COMMANDS_KEPT = 20
+SLOWEST_KEPT = 5
+
+STATS_HEADER = 'queries          ms  command'
+STATS_LINE = '{queries:7d} {ms:11.3f}  {command}'
+STATS_TOTAL = 'Total: {queries} queries, {ms:.3f} ms'
+STATS_SLOWEST = 'Slowest queries:'
+STATS_SLOW_LINE = '{ms:11.3f} ms  {sql}  {params}'
+NO_STATS = 'No commands yet'
+SLOW_LOG_LINE = '{time} {ms:.3f} ms {sql} {params}\n'
+
+
+def wanted(args):
+    """
+    Stats cost every statement some bookkeeping, so they're only
+    collected when asked for
+
+    :param args: parsed command line args
+    """
+    return bool(args.stats or args.slow_query_log)
+
+
+def start(args):
+    """
+    Count and time the statements run on models.db from now on.
+
+    :param args: parsed command line args (slow_query_log and
+                 slow_query_ms)
+    :return: the QueryStats collecting them
+    """
+    from models import db
+
+    db.query_stats = QueryStats(
+        slow_log=args.slow_query_log,
+        slow_ms=args.slow_query_ms
+    )
+    return db.query_stats
+
+
+def stop():
+    from models import db
+
+    if db.query_stats:
+        db.query_stats.close()
+        db.query_stats = None
+
+
+@contextmanager
+def collecting(args):
+    """
+    start(args) for the with block, if wanted (yields None otherwise);
+    prints the report to stderr if args.stats, so that it doesn't mix
+    with the command's output
+    """
+    query_stats = start(args) if wanted(args) else None
+    try:
+        yield query_stats
+    finally:
+        if query_stats:
+            if args.stats:
+                query_stats.print_report(out=sys.stderr)
+            stop()
+
+
+class QueryStats(object):
+    """
+    Statement counts and times per command (for the last COMMANDS_KEPT
+    commands), plus the SLOWEST_KEPT slowest statements with their
+    parameters. Statements that take at least slow_ms are appended to
+    the slow_log file, if given.
+
+    Times are for executing the statement, which for a query is up to
+    its first row: rows fetched later are not included.
+    """
+
+    def __init__(self, slow_log=None, slow_ms=SLOW_MS_DEFAULT):
+        self.slow_log = io.open(slow_log, 'a', encoding='utf-8') \
+            if slow_log else None
+        self.slow_seconds = slow_ms / 1000
+        self.reset()
+
+    def reset(self):
+        self.commands = deque(maxlen=COMMANDS_KEPT)
+        self.command = None  # [line, queries, seconds] while running
+        self.queries = 0
+        self.seconds = 0.0
+        self.slowest = []  # heap of (seconds, sql, params)
+
+    def start_command(self, line):
+        self.command = [line, 0, 0.0]
+        self.commands.append(self.command)
+
+    def end_command(self):
+        self.command = None
+
+    def record(self, sql, params, seconds):
+        self.queries += 1
+        self.seconds += seconds
+        if self.command:
+            self.command[1] += 1
+            self.command[2] += seconds
+
+        entry = (seconds, sql, tuple(params) if params else ())
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+        if self.slow_log and seconds >= self.slow_seconds:
+            self.slow_log.write(SLOW_LOG_LINE.format(
+                time=datetime.now().isoformat(),
+                ms=seconds * 1000,
+                sql=sql,
+                params=_format_params(entry[2])
+            ))
+            self.slow_log.flush()
+
+    def print_report(self, out=None):
+        """ :param out: file to print to (default: stdout) """
+        commands = [c for c in self.commands if c is not self.command]
+        if not commands:
+            print(NO_STATS, file=out)
+        else:
+            print(STATS_HEADER, file=out)
+            for line, queries, seconds in commands:
+                print(STATS_LINE.format(
+                    queries=queries,
+                    ms=seconds * 1000,
+                    command=line
+                ), file=out)
+
+        print(STATS_TOTAL.format(queries=self.queries,
+                                 ms=self.seconds * 1000), file=out)
+        if self.slowest:
+            print(STATS_SLOWEST, file=out)
+            for seconds, sql, params in sorted(self.slowest, reverse=True):
+                print(STATS_SLOW_LINE.format(
+                    ms=seconds * 1000,
+                    sql=sql,
+                    params=_format_params(params)
+                ), file=out)
+
+    def close(self):
+        if self.slow_log:
+            self.slow_log.close()
+            self.slow_log = None
+
+
+def _format_params(params):
+    return json.dumps(list(params), default=str)
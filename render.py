@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+from datetime import datetime, timedelta
+
+COLOR_AUTO = 'auto'
+COLOR_ALWAYS = 'always'
+COLOR_NEVER = 'never'
+COLOR_MODES = [COLOR_AUTO, COLOR_ALWAYS, COLOR_NEVER]
+
+CYAN = '\033[0;36m'
+RED = '\033[0;31m'
+GREEN = '\033[0;32m'
+RESET = '\033[0m'
+
+CHUNK_SIZE = 64 * 1024  # characters buffered before writing
+
+TASK_ROW = '{0:1}  {1:10}  {2:30}  {3}'
+TASK_INSTANCE_ROW = '{0:>3}  {1:10}  {2}'
+
+_color_mode = COLOR_AUTO
+
+
+def set_color_mode(mode):
+    """ :param mode: one of COLOR_MODES (auto: only if out is a tty) """
+    global _color_mode
+    _color_mode = mode
+
+
+class Renderer(object):
+    """
+    Formats list and history tables into a buffer that is written in
+    CHUNK_SIZE pieces rather than a print per row. "Now" is read once,
+    so every due date in a table is colored against the same time.
+    """
+
+    def __init__(self, out=None, now=None):
+        self.out = out if out else sys.stdout
+        self.color = _color_mode == COLOR_ALWAYS or (
+            _color_mode == COLOR_AUTO and _isatty(self.out)
+        )
+        self.lines = []
+        self.size = 0
+
+        # a due date (at any time of day) is due once its day has
+        # started, i.e. anything before the next midnight after now
+        now = now if now else datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.due_before = midnight + timedelta(days=1) \
+            if now > midnight else midnight
+
+        if self.color:
+            self.header_prefix, self.header_suffix = CYAN, RESET
+            self.due_prefix, self.not_due_prefix = RED, GREEN
+            self.due_suffix = RESET
+        else:
+            self.header_prefix = self.header_suffix = ''
+            self.due_prefix = self.not_due_prefix = self.due_suffix = ''
+
+    def header(self, text):
+        self.write(self.header_prefix + text + self.header_suffix)
+
+    def task_header(self):
+        self.header(TASK_ROW.format('p', 'due', 'task', 'note'))
+
+    def task(self, task):
+        """ :param task: views.TaskRow """
+        self.write(TASK_ROW.format(
+            task.priority,
+            self.get_due_date(task.due),
+            task.name,
+            task.note if task.note else ''
+        ))
+
+    def task_instance_header(self):
+        self.header(TASK_INSTANCE_ROW.format('#', 'done', 'note'))
+
+    def task_instance(self, num, inst):
+        """ :param inst: views.TaskInstanceRow """
+        self.write(TASK_INSTANCE_ROW.format(
+            num,
+            inst.done.isoformat()[:10] if inst.done else '(open)',
+            inst.note if inst.note else ''
+        ))
+
+    def get_due_date(self, due):
+        if due is None:
+            return ''
+        prefix = self.due_prefix if due < self.due_before \
+            else self.not_due_prefix
+        return prefix + due.isoformat()[:10] + self.due_suffix
+
+    def write(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.lines.append('')  # for the final newline
+            self.out.write('\n'.join(self.lines))
+            self.lines = []
+            self.size = 0
+
+
+def _isatty(out):
+    try:
+        return out.isatty()
+    except AttributeError:
+        return False
@@ -12,9 +12,9 @@ from peewee import SqliteDatabase
 import util
 from arghandler import ArgHandler
 from command import Command
-from models import Task, TaskInstance
+from models import CONNECT_PRAGMAS, Task, TaskInstance
 
-test_db = SqliteDatabase(':memory:')
+test_db = SqliteDatabase(':memory:', pragmas=CONNECT_PRAGMAS)
 TEST_FILES_DIR = 'tests/files/'
 TEMP_DB = TEST_FILES_DIR + 'temp.sqlite'
 
@@ -51,12 +51,6 @@ def create_test_data():
         name='just do it', note='bo knows', priority=4
     )
     goner = Task.create(name='goner', priority=util.PRIORITY_DELETED)
-    TaskInstance.create(
-        task=pencils, note='', due=datetime(2016, 10, 1)
-    )
-    TaskInstance.create(
-        task=pencils, note='', due=datetime(2016, 10, 2)
-    )
     TaskInstance.create(
         task=pencils, note='finally',
         due=datetime(2016, 10, 2, 15, 31),
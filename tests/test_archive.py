@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+import os
+from datetime import datetime
+
+from playhouse.test_utils import count_queries
+
+import archive
+import export
+import views
+from arghandler import ArgHandler
+from command import Command
+from models import Task, TaskInstance, TaskInstanceArchive, db
+from tests.data_setup import (TEMP_DB, TEST_FILES_DIR,
+                              create_history_test_data_for_temp_db,
+                              init_temp_database)
+from tests.helpers import Redirector
+
+NOW = datetime(2016, 10, 7, 9, 30)
+EXPORT_FILE = TEST_FILES_DIR + 'temp_archive_export.json'
+
+
+def get_rows(model):
+    return sorted((inst.task_id, inst.note, inst.due, inst.done)
+                  for inst in model.select())
+
+
+class ArchiveTests(Redirector):
+
+    def setUp(self):
+        super(ArchiveTests, self).setUp()
+        init_temp_database()
+        create_history_test_data_for_temp_db()
+        self.args = ArgHandler.get_args(['--database', TEMP_DB])
+
+    def tearDown(self):
+        super(ArchiveTests, self).tearDown()
+        if os.path.exists(EXPORT_FILE):
+            os.remove(EXPORT_FILE)
+
+    def archive(self, days=365, batch_size=archive.ARCHIVE_BATCH_SIZE):
+        with Command(self.args):
+            return archive.archive_task_instances(
+                days, now=NOW, batch_size=batch_size
+            )
+
+    @staticmethod
+    def export():
+        export.export_to_json(TEMP_DB, output=EXPORT_FILE, archived=True)
+        with open(EXPORT_FILE) as f:
+            return json.load(f)
+
+    def test_archive(self):
+        with Command(self.args):
+            hot_before = get_rows(TaskInstance)
+
+        self.assertEqual(3, self.archive())
+        self.assertTrue(self.redirect.getvalue().startswith(
+            'Archived 3 history items done before 2015-10-08 ('
+        ))
+
+        with Command(self.args):
+            archived = get_rows(TaskInstanceArchive)
+            hot = get_rows(TaskInstance)
+        # same rows, all done before the cutoff
+        self.assertEqual(hot_before, sorted(hot + archived))
+        self.assertTrue(all(row[3] < datetime(2015, 10, 8)
+                            for row in archived))
+        self.assertFalse([row for row in hot
+                          if row[3] and row[3] < datetime(2015, 10, 8)])
+
+        # nothing left to archive
+        self.assertEqual(0, self.archive())
+
+    def test_archive_again_after_ids_reused(self):
+        with Command(self.args) as interpreter:
+            interpreter.onecmd('add foo')
+            interpreter.onecmd('done foo 2016-01-01')
+            interpreter.onecmd('done foo 2016-02-01')
+            self.assertEqual(7, self.archive(days=30))
+            # sqlite gives the new row the id of the last one archived
+            interpreter.onecmd('done foo 2016-03-01')
+            self.assertEqual(1, self.archive(days=30))
+            self.assertEqual(
+                [datetime(2016, 1, 1), datetime(2016, 2, 1),
+                 datetime(2016, 3, 1)],
+                [inst.done for inst in TaskInstanceArchive.select().join(
+                    Task).where(Task.name == 'foo').order_by(
+                    TaskInstanceArchive.id)]
+            )
+
+    def test_archive_batches(self):
+        with Command(self.args):
+            with count_queries() as counter:
+                archived = archive.archive_task_instances(
+                    365, now=NOW, batch_size=2
+                )
+            self.assertEqual(3, archived)
+            self.assertEqual(3, TaskInstanceArchive.select().count())
+        # a batch of 2 and the remaining 1: each one insert and delete
+        self.assertEqual(
+            2,
+            len([q for q in counter.get_queries()
+                 if q.msg[0].startswith('INSERT')])
+        )
+
+    def test_history_archived(self):
+        with Command(self.args):
+            before = views._get_task_instance_list('climb mountain')
+        self.archive()
+        with Command(self.args):
+            self.assertEqual(
+                before[2:],
+                views._get_task_instance_list('climb mountain')
+            )
+            # archived items have the archive's ids
+            self.assertEqual(
+                [(inst.done, inst.note) for inst in before],
+                [(inst.done, inst.note) for inst in
+                 views._get_task_instances('climb mountain', archived=True)]
+            )
+            # all of its history archived
+            self.assertEqual(
+                [], views._get_task_instance_list('shave yak')
+            )
+            self.assertEqual(
+                1,
+                len(list(views._get_task_instances('shave yak',
+                                                   archived=True)))
+            )
+            self.assertEqual(
+                [], list(views._get_task_instances('slay dragon',
+                                                   archived=True))
+            )
+            self.assertIsNone(
+                views._get_task_instances('run', archived=True)
+            )
+
+    def test_history_archived_option(self):
+        self.archive()
+        self.reset_redirect()
+        with Command(self.args) as interpreter:
+            interpreter.onecmd('history shave yak')
+            self.assertEqual(views.NO_HISTORY,
+                             self.redirect.getvalue().rstrip())
+            self.reset_redirect()
+            interpreter.onecmd('history shave yak --archived')
+            self.assertIn('1976-03-04  yakkety sax',
+                          self.redirect.getvalue())
+
+    def test_export_archived(self):
+        before = self.export()
+        self.archive()
+        self.assertEqual(before, self.export())
+        export.export_to_json(TEMP_DB, output=EXPORT_FILE)
+        with open(EXPORT_FILE) as f:
+            self.assertEqual(
+                [],
+                [task['history'] for task in json.load(f)
+                 if task['name'] == 'shave yak'][0]
+            )
+
+    def test_delete_task_deletes_archive(self):
+        self.archive()
+        with Command(self.args):
+            Task.get(Task.name == 'shave yak').delete_instance()
+            self.assertEqual(2, TaskInstanceArchive.select().count())
+            self.assertEqual(0, db.execute_sql(
+                'SELECT count(*) FROM taskinstancearchive '
+                'WHERE task_id NOT IN (SELECT id FROM task)'
+            ).fetchone()[0])
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+import batch
+import todo
+import views
+from arghandler import ArgHandler
+from command import Command
+from models import Task
+from tests.data_setup import (TEST_FILES_DIR, create_test_data_for_temp_db,
+                              init_temp_database)
+from tests.helpers import Redirector
+
+BATCH_FILE = TEST_FILES_DIR + 'temp_batch.txt'
+
+
+class OutputTests(Redirector):
+
+    def tearDown(self):
+        super(OutputTests, self).tearDown()
+        if os.path.exists(BATCH_FILE):
+            os.remove(BATCH_FILE)
+
+    @staticmethod
+    def write_batch_file(*commands):
+        with open(BATCH_FILE, 'w') as f:
+            f.write('\n'.join(commands) + '\n')
+
+    def get_summaries(self):
+        return [line for line in self.redirect.getvalue().splitlines()
+                if line.startswith('Batch ')]
+
+    def test_batch(self):
+        temp_db = init_temp_database()
+        self.write_batch_file(
+            '# comment',
+            'add one',
+            '',
+            'add two 2',
+            'add three 3',
+            'done one',
+        )
+        result = todo.main([
+            '--batch', BATCH_FILE, '--batch-size', '3',
+            '--database', temp_db
+        ])
+        self.assertEqual(0, result)
+        output = self.redirect.getvalue()
+        self.assertIn(views.TASK_ADDED + 'three', output)
+        self.assertIn(views.TASK_DONE_DATE_SET, output)
+        summaries = self.get_summaries()
+        self.assertEqual(2, len(summaries))
+        self.assertTrue(summaries[0].startswith(
+            'Batch 1: 3 commands, 0 errors'
+        ))
+        self.assertTrue(summaries[1].startswith(
+            'Batch 2: 1 commands, 0 errors'
+        ))
+        self.assertEqual(3, Task.select().count())
+
+    def test_batch_stops_on_error(self):
+        temp_db = init_temp_database()
+        self.write_batch_file('add one', 'done nothing', 'add two')
+        result = todo.main(['--batch', BATCH_FILE, '--database', temp_db])
+        self.assertEqual(1, result)
+        output = self.redirect.getvalue()
+        self.assertIn(batch.BATCH_STOPPED, output)
+        self.assertNotIn(views.TASK_ADDED + 'two', output)
+        self.assertTrue(self.get_summaries()[0].startswith(
+            'Batch 1: 2 commands, 1 errors'
+        ))
+        # commands before the error are kept
+        self.assertEqual(['one'], [t.name for t in Task.select()])
+
+    def test_batch_keep_going(self):
+        temp_db = init_temp_database()
+        self.write_batch_file('add one', 'cthulu', 'add two')
+        result = todo.main([
+            '--batch', BATCH_FILE, '--keep-going', '--database', temp_db
+        ])
+        self.assertEqual(1, result)
+        self.assertNotIn(batch.BATCH_STOPPED, self.redirect.getvalue())
+        self.assertTrue(self.get_summaries()[0].startswith(
+            'Batch 1: 3 commands, 1 errors'
+        ))
+        self.assertEqual(2, Task.select().count())
+
+    def test_batch_quit(self):
+        temp_db = init_temp_database()
+        self.write_batch_file('add one', 'quit', 'add two')
+        todo.main(['--batch', BATCH_FILE, '--database', temp_db])
+        self.assertEqual(['one'], [t.name for t in Task.select()])
+
+    def test_batch_rolled_back_on_exception(self):
+        temp_db = init_temp_database()
+        create_test_data_for_temp_db()
+        args = ArgHandler.get_args(['--database', temp_db])
+        commands = ['add one', 'delete goner', 'list']
+
+        def fail(arg):
+            raise ValueError('kaboom')
+
+        with Command(args) as interpreter:
+            interpreter.do_list = fail
+            ok = batch.run_batch(interpreter, commands, batch_size=5)
+            self.assertFalse(ok)
+            self.assertEqual(
+                0, Task.select().where(Task.name == 'one').count()
+            )
+            self.assertEqual(
+                1, Task.select().where(Task.name == 'goner').count()
+            )
+        self.assertIn(
+            batch.BATCH_FAILED.format(num=1, error='kaboom', commands=3),
+            self.redirect.getvalue()
+        )
+
+    def test_batch_keep_going_after_rollback(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        commands = ['add one', 'list', 'add two']
+
+        def fail(arg):
+            raise ValueError('kaboom')
+
+        with Command(args) as interpreter:
+            interpreter.do_list = fail
+            ok = batch.run_batch(interpreter, commands, batch_size=5,
+                                 keep_going=True)
+            self.assertFalse(ok)
+            # the rolled back batch's commands stay undone, the next
+            # batch starts after the command that raised
+            self.assertEqual(['two'], [t.name for t in Task.select()])
+        summaries = self.get_summaries()
+        self.assertTrue(summaries[0].startswith(
+            'Batch 1: 2 commands, 1 errors'
+        ))
+        self.assertTrue(summaries[1].startswith(
+            'Batch 2: 1 commands, 0 errors'
+        ))
+        self.assertIn(
+            batch.BATCH_FAILED.format(num=1, error='kaboom', commands=2),
+            self.redirect.getvalue()
+        )
+
+    def test_batch_stops_on_failure_without_error_message(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        commands = ['add one', 'edit one', 'add two']
+        views.raw_input = lambda prompt: 'q'  # cancel the edit
+        try:
+            with Command(args) as interpreter:
+                ok = batch.run_batch(interpreter, commands)
+                self.assertFalse(ok)
+                self.assertEqual(['one'], [t.name for t in Task.select()])
+        finally:
+            views.raw_input = raw_input
+        output = self.redirect.getvalue()
+        self.assertIn(views.EDIT_CANCELLED, output)
+        self.assertIn(batch.BATCH_STOPPED, output)
+
+    def test_batch_file_not_found(self):
+        todo.main(['--batch', 'spam-spam-spam-baked-beans.txt'])
+        self.assertEqual(
+            'Batch file not found: spam-spam-spam-baked-beans.txt',
+            self.redirect.getvalue().rstrip()
+        )
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import benchmark
+from tests.data_setup import TEST_FILES_DIR
+from tests.helpers import Redirector
+
+
+def get_results(**p50s):
+    return {'scales': {'1000': {'commands': {
+        name: {'p50_ms': p50} for name, p50 in p50s.items()
+    }}}}
+
+
+class BenchmarkTests(Redirector):
+
+    def test_percentiles(self):
+        results = benchmark.get_percentiles(range(100, 0, -1))
+        self.assertEqual(
+            {'runs': 100, 'max_ms': 100, 'p50_ms': 50, 'p90_ms': 90,
+             'p99_ms': 99},
+            results
+        )
+        results = benchmark.get_percentiles([3.0])
+        self.assertEqual(3.0, results['p50_ms'])
+        self.assertEqual(3.0, results['p99_ms'])
+
+    def test_parse_scales(self):
+        self.assertEqual([1000, 20], benchmark.parse_scales('1000,20'))
+        self.assertIsNone(benchmark.parse_scales('1000,x'))
+        self.assertIsNone(benchmark.parse_scales('5'))
+        self.assertEqual(
+            benchmark.INVALID_SCALES + '1000,x\n' +
+            benchmark.INVALID_SCALES + '5\n',
+            self.redirect.getvalue()
+        )
+
+    def test_compare_results(self):
+        regressions = benchmark.compare_results(
+            get_results(list=13.0, history=2.0, add=1.0),
+            get_results(list=10.0, history=2.0, done=1.0),
+            threshold=0.2
+        )
+        self.assertEqual(1, regressions)
+        lines = self.redirect.getvalue().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[1].strip().startswith('history'))
+        self.assertFalse(lines[1].endswith(benchmark.REGRESSION_FLAG))
+        self.assertTrue(lines[2].endswith(benchmark.REGRESSION_FLAG))
+        self.assertTrue(lines[3].startswith('*** 1 regression'))
+
+    def test_run_scale(self):
+        results = benchmark.run_scale(
+            100, TEST_FILES_DIR, runs=2, export_runs=1
+        )
+        self.assertEqual(10, results['tasks'])
+        self.assertTrue(results['peak_memory_kb'] > 0)
+        self.assertEqual(
+            ['add', 'complete', 'delete', 'done', 'due', 'export',
+             'history', 'list', 'list due', 'next'],
+            sorted(results['commands'])
+        )
+        self.assertEqual(1, results['commands']['export']['runs'])
+        self.assertEqual(2, results['commands']['list']['runs'])
@@ -4,14 +4,20 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import os
+import pstats
+from datetime import datetime, timedelta
 from unittest import TestCase
 
+from playhouse.test_utils import count_queries
+
 import command
+import profiler
+import querystats
 import util
 import views
 from arghandler import ArgHandler
 from command import Command
-from models import Task, TaskInstance
+from models import Task, TaskInstance, db
 from tests.data_setup import (create_history_test_data_for_temp_db,
                               create_test_data_for_temp_db, init_temp_database)
 from tests.helpers import Redirector
@@ -147,12 +153,18 @@ class OutputTests(Redirector):
             'aliases',
             'quit', 'q', 'EOF',
             'list', 'l', 'll',
+            'next', 'n',
             'add', 'a',
             'edit', 'e',
             'delete', 'del',
             'history', 'h',
             'due',
-            'done'
+            'done',
+            'profile',
+            'stats',
+            'maintain',
+            'archive',
+            'search'
         ]
         for c in commands:
             self.reset_redirect()
@@ -171,13 +183,19 @@ class OutputTests(Redirector):
             'help help',
             'help aliases',
             'help list', 'help l', 'help ll',
+            'help next', 'help n',
             'help quit', 'help q', 'help EOF',
             'help add', 'help a',
             'help edit', 'help e',
             'help delete', 'help del',
             'help history', 'help h',
             'help due',
-            'help done'
+            'help done',
+            'help profile',
+            'help stats',
+            'help maintain',
+            'help archive',
+            'help search'
         ]
         for c in commands:
             self.reset_redirect()
@@ -188,6 +206,229 @@ class OutputTests(Redirector):
                 self.redirect.getvalue().startswith(command.NO_HELP)
             )
 
+    def test_completion_names_updated_by_add_edit_delete(self):
+        temp_db = init_temp_database()
+        create_test_data_for_temp_db()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            self.assertEqual(
+                ['gather wool'],
+                interpreter.complete_done('g', '', '', '')
+            )
+            interpreter.do_add('gargle')
+            self.assertEqual(
+                ['gargle', 'gather wool'],
+                interpreter.complete_done('g', '', '', '')
+            )
+            interpreter.do_delete('gather wool')
+            self.assertEqual(
+                ['gargle'],
+                interpreter.complete_done('g', '', '', '')
+            )
+            task_names = interpreter.task_names
+            views.raw_input = self.mock_raw_input
+            try:
+                self.responses = ['gnu', '', '']  # rename
+                interpreter.do_edit('gargle')
+                self.responses = ['', '9', '']  # delete
+                interpreter.do_edit('clip toenails')
+                self.responses = ['', '', '']  # history, not a task name
+                interpreter.do_edit('history sharpen pencils')
+            finally:
+                views.raw_input = raw_input
+            self.assertEqual(['gnu', 'just do it', 'sharpen pencils'],
+                             task_names)
+            self.assertEqual(['gnu'],
+                             interpreter.complete_done('g', '', '', ''))
+            # updated in place, never rebuilt
+            self.assertIs(task_names, interpreter.task_names)
+            self.assertEqual(sorted(views.get_task_names()), task_names)
+            # deleting forever: goner wasn't in the index
+            interpreter.do_delete('goner')
+            self.assertEqual(3, len(task_names))
+
+    def mock_raw_input(self, prompt):
+        return self.responses.pop(0)
+
+    def test_failed(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            for line, failed in [
+                ('add one', False),
+                ('add one', True),
+                ('a two', False),
+                ('list', False),
+                ('list 5', True),
+                ('done one', False),
+                ('done nothing', True),
+                ('due one 5z', True),
+                ('history one', False),
+                ('history', True),
+                ('search nothing', False),
+                ('search', True),
+                ('stats bogus', True),
+                ('cthulu', True),
+                ('delete one', False),
+            ]:
+                interpreter.onecmd(line)
+                self.assertEqual(failed, interpreter.failed, line)
+
+
+class ProfileTests(Redirector):
+
+    PROFILE_FILE = 'tests/files/temp_profile.prof'
+
+    def tearDown(self):
+        super(ProfileTests, self).tearDown()
+        if os.path.exists(self.PROFILE_FILE):
+            os.remove(self.PROFILE_FILE)
+
+    def test_profile_on_off(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            self.assertNotIn('onecmd', vars(interpreter))
+            interpreter.onecmd('profile on')
+            interpreter.onecmd('list')
+            output = self.redirect.getvalue()
+            self.assertTrue(output.startswith(command.PROFILE_ON))
+            self.assertIn(views.NO_TASKS, output)
+            self.assertIn('Ordered by: cumulative time', output)
+            self.assertIn('(do_list)', output)
+
+            self.reset_redirect()
+            interpreter.onecmd('profile off')
+            interpreter.onecmd('list')
+            self.assertNotIn('onecmd', vars(interpreter))
+            self.assertEqual(
+                command.PROFILE_OFF + '\n' + views.NO_TASKS + '\n',
+                self.redirect.getvalue()
+            )
+
+    def test_profile_to_file(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args([
+            '--database', temp_db,
+            '--profile-output', self.PROFILE_FILE
+        ])
+        with Command(args) as interpreter:
+            interpreter.onecmd('list')
+            interpreter.onecmd('next')
+            self.assertNotIn('cumulative', self.redirect.getvalue())
+        self.assertNotIn('onecmd', vars(interpreter))
+        self.assertIn(
+            profiler.PROFILE_SAVED.format(file=self.PROFILE_FILE),
+            self.redirect.getvalue()
+        )
+        functions = [function for _, _, function
+                     in pstats.Stats(self.PROFILE_FILE).stats]
+        self.assertIn('do_list', functions)
+        self.assertIn('do_next', functions)
+
+    def test_profile_flag(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db, '--profile'])
+        with Command(args) as interpreter:
+            interpreter.onecmd('next')
+        self.assertIn('(do_next)', self.redirect.getvalue())
+
+    def test_profile_syntax(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            for line in ['profile', 'profile maybe', 'profile on a b']:
+                interpreter.onecmd(line)
+        self.assertEqual(
+            [command.PROFILE_SYNTAX] * 3,
+            self.redirect.getvalue().splitlines()
+        )
+        self.assertIsNone(interpreter.profiler)
+
+
+class StatsTests(Redirector):
+
+    def test_stats(self):
+        temp_db = init_temp_database()
+        create_test_data_for_temp_db()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            # not collected until asked for
+            self.assertIsNone(db.query_stats)
+            interpreter.onecmd('list')
+            self.reset_redirect()
+            interpreter.onecmd('stats')
+            self.assertEqual(command.STATS_STARTED,
+                             self.redirect.getvalue().rstrip())
+            self.assertIsNotNone(db.query_stats)
+            interpreter.onecmd('list')
+            interpreter.onecmd('history gather wool')
+            self.reset_redirect()
+            interpreter.onecmd('stats')
+            lines = self.redirect.getvalue().splitlines()
+            self.assertEqual(querystats.STATS_HEADER, lines[0])
+            self.assertTrue(lines[1].startswith('      1 '))
+            self.assertTrue(lines[1].endswith('  list'))
+            self.assertTrue(lines[2].endswith('  history gather wool'))
+            self.assertTrue(lines[3].startswith('Total: '))
+
+            self.reset_redirect()
+            interpreter.onecmd('stats reset')
+            interpreter.onecmd('stats')
+            interpreter.onecmd('stats bogus')
+            self.assertEqual(
+                [command.STATS_RESET, querystats.NO_STATS,
+                 querystats.STATS_TOTAL.format(queries=0, ms=0),
+                 command.STATS_SYNTAX],
+                self.redirect.getvalue().splitlines()
+            )
+
+    def test_stats_on_exit(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db, '--stats'])
+        with Command(args) as interpreter:
+            interpreter.onecmd('next')
+        self.assertNotIn(querystats.STATS_HEADER, self.redirect.getvalue())
+        output = self.redirecterr.getvalue()
+        self.assertIn(querystats.STATS_HEADER, output)
+        self.assertIn('  next\nTotal: ', output)
+        self.assertIsNone(db.query_stats)
+
+
+class MaintainTests(Redirector):
+
+    def test_maintain_syntax(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            interpreter.onecmd('maintain 30 days')
+            interpreter.onecmd('maintain -1')
+            interpreter.onecmd('archive 1y')
+        self.assertEqual(
+            [command.MAINTAIN_SYNTAX] * 2 + [command.ARCHIVE_SYNTAX],
+            self.redirect.getvalue().splitlines()
+        )
+
+    def test_maintain_days(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            Task.create(name='goner', priority=util.PRIORITY_DELETED,
+                        deleted=datetime.now() - timedelta(days=2))
+            interpreter.onecmd('maintain')
+            self.assertTrue(Task.select().exists())
+            interpreter.onecmd('maintain 1')
+            self.assertFalse(Task.select().exists())
+
+    def test_maintain_purges_task_added_deleted(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            interpreter.onecmd('add goner 9')
+            self.assertIsNotNone(Task.get(Task.name == 'goner').deleted)
+            interpreter.onecmd('maintain 0')
+            self.assertFalse(Task.select().exists())
+
 
 class MiscTests(TestCase):
 
@@ -212,7 +453,7 @@ class MiscTests(TestCase):
         args = ArgHandler.get_args(['--database', temp_db])
         with Command(args) as interpreter:
             tasks = interpreter.complete_history('s', '', '', '')
-            self.assertEqual(['slay dragon', 'shave yak'], tasks)
+            self.assertEqual(['shave yak', 'slay dragon'], tasks)
 
     def test_complete_due(self):
         temp_db = init_temp_database()
@@ -238,6 +479,17 @@ class MiscTests(TestCase):
             tasks = interpreter.complete_edit('c', '', '', '')
             self.assertEqual(['clip toenails'], tasks)
 
+    def test_completion_names_read_once(self):
+        temp_db = init_temp_database()
+        create_test_data_for_temp_db()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args) as interpreter:
+            with count_queries() as counter:
+                interpreter.complete_done('', '', '', '')
+                tasks = interpreter.complete_due('g', '', '', '')
+            self.assertEqual(['gather wool'], tasks)
+            self.assertEqual(1, counter.count)
+
     def test_complete_edit_history(self):
         """ history manually added to list if matching """
         temp_db = init_temp_database()
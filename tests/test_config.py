@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+
+import config
+from arghandler import ArgHandler
+from config import PRAGMA_PROFILES, PROFILE_DEFAULT, PROFILE_FAST
+from tests.data_setup import TEST_FILES_DIR
+from tests.helpers import Redirector
+
+CONFIG_FILE = TEST_FILES_DIR + 'temp_todo.ini'
+
+
+class ConfigTests(Redirector):
+
+    def tearDown(self):
+        super(ConfigTests, self).tearDown()
+        if os.path.exists(CONFIG_FILE):
+            os.remove(CONFIG_FILE)
+
+    @staticmethod
+    def write_config(*lines):
+        with open(CONFIG_FILE, 'w') as f:
+            f.write('\n'.join(('[database]',) + lines) + '\n')
+
+    @staticmethod
+    def get_pragmas(*argv):
+        args = ArgHandler.get_args(('--config', CONFIG_FILE) + argv)
+        return config.get_pragmas(args)
+
+    def test_no_config_file(self):
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_DEFAULT],
+            self.get_pragmas()
+        )
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_FAST],
+            self.get_pragmas('--db-profile', PROFILE_FAST)
+        )
+
+    def test_profile_from_config_file(self):
+        self.write_config('profile = fast')
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_FAST],
+            self.get_pragmas()
+        )
+        # command line wins
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_DEFAULT],
+            self.get_pragmas('--db-profile', PROFILE_DEFAULT)
+        )
+
+    def test_config_file_overrides(self):
+        self.write_config(
+            'profile = fast',
+            'cache_size = -2000',
+            'temp_store = file',
+            'not_a_pragma = 1'
+        )
+        pragmas = dict(self.get_pragmas())
+        self.assertEqual('-2000', pragmas['cache_size'])
+        self.assertEqual('file', pragmas['temp_store'])
+        self.assertEqual('wal', pragmas['journal_mode'])
+        self.assertNotIn('not_a_pragma', pragmas)
+
+    def test_config_file_bad_values(self):
+        self.write_config('profile = ludicrous', 'synchronous = off; drop')
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_DEFAULT],
+            self.get_pragmas()
+        )
+        self.assertEqual(
+            [config.UNKNOWN_PROFILE + 'ludicrous',
+             config.INVALID_PRAGMA_VALUE.format(
+                pragma='synchronous',
+                value='off; drop'
+             )],
+            self.redirect.getvalue().splitlines()
+        )
+
+    def test_config_file_unparseable(self):
+        with open(CONFIG_FILE, 'w') as f:
+            f.write('profile = fast\n')
+        self.assertEqual(
+            PRAGMA_PROFILES[PROFILE_DEFAULT],
+            self.get_pragmas()
+        )
+        self.assertTrue(self.redirect.getvalue().startswith(
+            config.CONFIG_ERROR
+        ))
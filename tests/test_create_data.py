@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import sqlite3
+from datetime import datetime
+
+import create_data
+from tests.data_setup import TEST_FILES_DIR
+from tests.helpers import Redirector
+
+DATA_DB = TEST_FILES_DIR + 'temp_data{num}.sqlite'
+NOW = datetime(2016, 10, 7, 9, 30)
+
+
+def get_rows(db_file):
+    conn = sqlite3.connect(db_file)
+    rows = (conn.execute('SELECT * FROM task ORDER BY id').fetchall(),
+            conn.execute('SELECT * FROM taskinstance ORDER BY id').fetchall())
+    conn.close()
+    return rows
+
+
+class CreateDataTests(Redirector):
+
+    def setUp(self):
+        super(CreateDataTests, self).setUp()
+        self.db_files = []
+
+    def tearDown(self):
+        super(CreateDataTests, self).tearDown()
+        for db_file in self.db_files:
+            if os.path.exists(db_file):
+                os.remove(db_file)
+
+    def create(self, num_tasks=30, instances_per_task=4, seed=0, jobs=1,
+               open_ratio=0.5):
+        db_file = DATA_DB.format(num=len(self.db_files))
+        self.db_files.append(db_file)
+        if os.path.exists(db_file):
+            os.remove(db_file)
+        counts = create_data.create_data(
+            db_file,
+            num_tasks=num_tasks,
+            instances_per_task=instances_per_task,
+            priorities=[(1, 50), (4, 50)],
+            open_ratio=open_ratio,
+            seed=seed,
+            now=NOW,
+            jobs=jobs
+        )
+        self.assertEqual((num_tasks, num_tasks * instances_per_task), counts)
+        return get_rows(db_file)
+
+    def test_create_data_rows(self):
+        tasks, instances = self.create()
+        self.assertEqual(set([1, 4]), set(t[3] for t in tasks))
+        for inst in instances:
+            if inst[4] is not None:
+                self.assertTrue(inst[3] <= inst[4] < '2016-10-07 09:30:00')
+
+    def test_create_data_open_ratio(self):
+        _, instances = self.create(open_ratio=1)
+        self.assertEqual(30, sum(1 for inst in instances if inst[4] is None))
+        _, instances = self.create(open_ratio=0)
+        self.assertFalse([inst for inst in instances if inst[4] is None])
+
+    def test_create_data_seed(self):
+        self.assertEqual(self.create(), self.create())
+        self.assertNotEqual(self.create(), self.create(seed=1))
+
+    def test_create_data_shards(self):
+        save_tasks_per_seed = create_data.TASKS_PER_SEED
+        create_data.TASKS_PER_SEED = 10
+        try:
+            self.assertEqual(self.create(), self.create(jobs=2))
+        finally:
+            create_data.TASKS_PER_SEED = save_tasks_per_seed
+        self.assertFalse([f for f in self.db_files
+                          if os.path.exists(f + '.shard0')])
+
+    def test_create_data_invalid_priority_mix(self):
+        self.assertIsNone(create_data.parse_priority_mix('1:30,5'))
+        self.assertEqual('*** Invalid priority mix: 1:30,5\n',
+                         self.redirect.getvalue())
+        self.assertIsNone(create_data.parse_priority_mix('0:30'))
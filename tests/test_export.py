@@ -3,11 +3,20 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import json
+import os
+from datetime import datetime
+
+from playhouse.test_utils import count_queries
+
 import export
 import todo
+from arghandler import ArgHandler
+from command import Command
+from models import Task, TaskInstance
 from tests.data_setup import (create_history_test_data_for_temp_db,
                               create_test_data_for_temp_db, init_temp_database)
-from tests.helpers import OutputFileTester
+from tests.helpers import OutputFileTester, Redirector
 
 
 class FileTests(OutputFileTester):
@@ -26,3 +35,72 @@ class FileTests(OutputFileTester):
         self.init_test('test_export_2')
         todo.main(['-e', '--database', temp_db])
         self.conclude_test()
+
+    def test_export_stream(self):
+        """ streamed output is identical to regular export """
+        temp_db = init_temp_database()
+        create_test_data_for_temp_db()
+        create_history_test_data_for_temp_db()
+        self.init_test('test_export')
+        todo.main(['-e', '--stream', '--database', temp_db])
+        self.conclude_test()
+
+    def test_export_stream_to_file(self):
+        temp_db = init_temp_database()
+        create_history_test_data_for_temp_db()
+        self.init_test('test_export_2')
+        output = self.TEST_FILES_DIR + 'temp_export.json'
+        export.export_to_json(temp_db, stream=True, output=output)
+        with open(output) as f:
+            print(f.read(), end='')
+        os.remove(output)
+        self.conclude_test()
+
+
+class OutputTests(Redirector):
+
+    def test_export_stream_empty_database(self):
+        temp_db = init_temp_database()
+        export.export_to_json(temp_db, stream=True)
+        self.assertEqual('[]\n', self.redirect.getvalue())
+
+    def test_export_ndjson(self):
+        temp_db = init_temp_database()
+        create_history_test_data_for_temp_db()
+        export.export_to_json(temp_db)
+        expected = json.loads(self.redirect.getvalue())
+        self.reset_redirect()
+        todo.main(['-e', '--ndjson', '--database', temp_db])
+        lines = self.redirect.getvalue().splitlines()
+        self.assertEqual(len(expected), len(lines))
+        self.assertEqual(expected, [json.loads(line) for line in lines])
+        # compact: no spaces after the separators
+        self.assertNotIn('", "', lines[0])
+        self.assertNotIn('": ', lines[0])
+
+
+class QueryTests(Redirector):
+
+    @staticmethod
+    def count_export_queries(temp_db):
+        with count_queries() as counter:
+            export.export_to_json(temp_db)
+        return counter.count
+
+    def test_export_query_count_independent_of_task_count(self):
+        temp_db = init_temp_database()
+        create_history_test_data_for_temp_db()
+        expected = self.count_export_queries(temp_db)
+
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args):
+            for i in range(20):
+                task = Task.create(name='task {}'.format(i), priority=2)
+                TaskInstance.create(
+                    task=task,
+                    due=datetime(2016, 10, 1),
+                    done=datetime(2016, 10, 2)
+                )
+                TaskInstance.create(task=task, due=datetime(2016, 11, 1))
+
+        self.assertEqual(expected, self.count_export_queries(temp_db))
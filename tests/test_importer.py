@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os
+import sys
+
+import export
+import importer
+import todo
+from models import Task, TaskInstance
+from tests.data_setup import (TEST_FILES_DIR,
+                              create_history_test_data_for_temp_db,
+                              create_test_data_for_temp_db, init_temp_database)
+from tests.helpers import OutputFileTester, Redirector
+
+IMPORT_DB = TEST_FILES_DIR + 'temp_import.sqlite'
+EXPORT_FILE = TEST_FILES_DIR + 'temp_export.json'
+
+
+def export_temp_database(ndjson=False):
+    temp_db = init_temp_database()
+    create_test_data_for_temp_db()
+    create_history_test_data_for_temp_db()
+    export.export_to_json(temp_db, ndjson=ndjson, output=EXPORT_FILE)
+    return temp_db
+
+
+def remove_import_database():
+    if os.path.exists(IMPORT_DB):
+        os.remove(IMPORT_DB)
+
+
+class FileTests(OutputFileTester):
+
+    def tearDown(self):
+        super(FileTests, self).tearDown()
+        os.remove(EXPORT_FILE)
+
+    def round_trip(self, ndjson=False):
+        export_temp_database(ndjson=ndjson)
+        remove_import_database()
+        save_stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')  # don't want to see summary
+        importer.import_from_json(IMPORT_DB, EXPORT_FILE)
+        sys.stdout = save_stdout
+        self.init_test('test_export')
+        export.export_to_json(IMPORT_DB)
+        self.conclude_test()
+
+    def test_import_round_trip(self):
+        self.round_trip()
+
+    def test_import_ndjson_round_trip(self):
+        self.round_trip(ndjson=True)
+
+    def test_import_small_batches_and_reads(self):
+        save_batch_size = importer.IMPORT_BATCH_SIZE
+        save_chunk_size = importer.READ_CHUNK_SIZE
+        importer.IMPORT_BATCH_SIZE = 3
+        importer.READ_CHUNK_SIZE = 10
+        try:
+            self.round_trip()
+        finally:
+            importer.IMPORT_BATCH_SIZE = save_batch_size
+            importer.READ_CHUNK_SIZE = save_chunk_size
+
+
+class OutputTests(Redirector):
+
+    def test_import_via_todo(self):
+        export_temp_database()
+        remove_import_database()
+        todo.main(['--import', EXPORT_FILE, '--database', IMPORT_DB])
+        os.remove(EXPORT_FILE)
+        self.assertEqual(
+            importer.IMPORTED.format(tasks=8, instances=11),
+            self.redirect.getvalue().rstrip()
+        )
+
+    def test_import_database_not_specified(self):
+        todo.main(['--import', EXPORT_FILE])
+        self.assertEqual(
+            'Database is required for import',
+            self.redirect.getvalue().rstrip()
+        )
+
+    def test_import_file_not_found(self):
+        json_file = 'spam-spam-spam-baked-beans.json'
+        importer.import_from_json(IMPORT_DB, json_file)
+        self.assertEqual(
+            importer.IMPORT_FILE_NOT_FOUND + json_file,
+            self.redirect.getvalue().rstrip()
+        )
+
+    def test_import_deleted_date(self):
+        export_temp_database()
+        remove_import_database()
+        importer.import_from_json(IMPORT_DB, EXPORT_FILE)
+        os.remove(EXPORT_FILE)
+        deleted = Task.get(Task.name == 'goner').deleted
+        self.assertEqual(0, deleted.microsecond)
+
+    def test_import_duplicate_task_stops(self):
+        temp_db = export_temp_database()
+        importer.import_from_json(temp_db, EXPORT_FILE)
+        os.remove(EXPORT_FILE)
+        self.assertTrue(self.redirect.getvalue().startswith(
+            importer.IMPORT_STOPPED
+        ))
+        # nothing from the failed batch was written
+        self.assertEqual(8, Task.select().count())
+        self.assertEqual(11, TaskInstance.select().count())
+
+    def test_import_collapses_open_instances(self):
+        # as exported from a database before one open instance per task
+        remove_import_database()
+        with io.open(EXPORT_FILE, 'w', encoding='utf-8') as f:
+            f.write(
+                '[{"name": "climb mountain", "priority": 1, "note": "", '
+                '"history": ['
+                '{"due": "2016-10-03 00:00:00", "done": null, "note": ""}, '
+                '{"due": "2016-10-01 00:00:00", "done": '
+                '"2016-10-02 00:00:00", "note": "phew!"}, '
+                '{"due": "2016-10-08 00:00:00", "done": null, '
+                '"note": "latest"}, '
+                '{"due": "2016-10-05 00:00:00", "done": null, "note": ""}'
+                ']}]'
+            )
+        importer.import_from_json(IMPORT_DB, EXPORT_FILE)
+        os.remove(EXPORT_FILE)
+        self.assertEqual(
+            importer.IMPORTED.format(tasks=1, instances=2),
+            self.redirect.getvalue().rstrip()
+        )
+        self.assertEqual(
+            ['latest'],
+            [inst.note for inst in
+             TaskInstance.select().where(TaskInstance.done >> None)]
+        )
+        # on a due date tie, the later one
+        tied = [(1, note, '2016-10-08 00:00:00', None) for note in 'ab']
+        self.assertEqual([tied[1]], importer._collapse_open_instances(tied))
+
+    def test_import_invalid_date(self):
+        remove_import_database()
+        with io.open(EXPORT_FILE, 'w', encoding='utf-8') as f:
+            f.write(
+                '{"name": "climb mountain", "priority": 1, "note": "", '
+                '"history": [{"due": "2016-10-03", "done": null, '
+                '"note": ""}]}\n'
+            )
+        importer.import_from_json(IMPORT_DB, EXPORT_FILE)
+        os.remove(EXPORT_FILE)
+        self.assertTrue(self.redirect.getvalue().startswith(
+            importer.IMPORT_INVALID + 'invalid date: 2016-10-03'
+        ))
+        self.assertFalse(Task.select().exists())
+
+    def test_iter_json_objects(self):
+        text = '[\n  {"a": 1}, \n {"b": [2, 3]}\n]\n'
+        self.assertEqual(
+            [{'a': 1}, {'b': [2, 3]}],
+            list(importer._iter_json_objects(io.StringIO(text)))
+        )
+        text = '{"a": 1}\n{"b": {"c": "}"}}\n'
+        self.assertEqual(
+            [{'a': 1}, {'b': {'c': '}'}}],
+            list(importer._iter_json_objects(io.StringIO(text)))
+        )
+        self.assertEqual(
+            [],
+            list(importer._iter_json_objects(io.StringIO('[]')))
+        )
+
+    def test_iter_json_objects_invalid(self):
+        with self.assertRaises(ValueError):
+            list(importer._iter_json_objects(io.StringIO('[{"a": ')))
+        with self.assertRaises(ValueError):
+            list(importer._iter_json_objects(io.StringIO('[1, 2]')))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from datetime import datetime
+
+import maintenance
+from arghandler import ArgHandler
+from command import Command
+from models import Task, TaskInstance, db
+from tests.data_setup import (TEMP_DB, create_test_data_for_temp_db,
+                              init_temp_database)
+from tests.helpers import Redirector
+
+NOW = datetime(2016, 10, 7, 9, 30)
+
+
+class MaintenanceTests(Redirector):
+
+    def setUp(self):
+        super(MaintenanceTests, self).setUp()
+        init_temp_database()
+        create_test_data_for_temp_db()
+        self.args = ArgHandler.get_args(['--database', TEMP_DB])
+
+    def maintain(self, purge_days=30):
+        self.reset_redirect()
+        ok = maintenance.maintain(purge_days, now=NOW)
+        return ok, self.redirect.getvalue().splitlines()
+
+    @staticmethod
+    def add_deleted_task(name, deleted, instances=3):
+        task = Task.create(name=name, priority=9, deleted=deleted)
+        for day in range(1, instances + 1):
+            TaskInstance.create(task=task, due=datetime(2016, 1, day),
+                                done=datetime(2016, 1, day))
+
+    def test_purge(self):
+        with Command(self.args):
+            self.add_deleted_task('old', datetime(2016, 9, 1))
+            self.add_deleted_task('recent', datetime(2016, 9, 30))
+            tasks_before = Task.select().count()
+            instances_before = TaskInstance.select().count()
+
+            ok, lines = self.maintain()
+            self.assertTrue(ok)
+            self.assertEqual(maintenance.MAINTAIN_HEADER, lines[0])
+            self.assertTrue(lines[1].startswith('purge '))
+            self.assertTrue(lines[1].endswith(
+                maintenance.PURGED.format(tasks=1, instances=3)
+            ))
+            self.assertEqual(tasks_before - 1, Task.select().count())
+            self.assertEqual(instances_before - 3,
+                             TaskInstance.select().count())
+            self.assertFalse(Task.select().where(Task.name == 'old').exists())
+
+            # nothing left to purge, until the cutoff moves
+            _, lines = self.maintain()
+            self.assertTrue(lines[1].endswith(
+                maintenance.PURGED.format(tasks=0, instances=0)
+            ))
+            _, lines = self.maintain(purge_days=0)
+            self.assertTrue(lines[1].endswith(
+                maintenance.PURGED.format(tasks=1, instances=3)
+            ))
+
+    def test_purge_history_without_task(self):
+        with Command(self.args):
+            # e.g. written by a client that doesn't enforce foreign keys
+            db.execute_sql('PRAGMA foreign_keys = off')
+            TaskInstance.insert(task=999, due=NOW).execute()
+            db.execute_sql('PRAGMA foreign_keys = on')
+            _, lines = self.maintain()
+            self.assertTrue(lines[1].endswith(
+                maintenance.PURGED.format(tasks=0, instances=1)
+            ))
+            self.assertFalse(TaskInstance.select().where(
+                TaskInstance.task == 999
+            ).exists())
+
+    def test_steps_and_totals(self):
+        with Command(self.args):
+            ok, lines = self.maintain()
+            self.assertTrue(ok)
+            self.assertEqual(
+                ['purge', 'collapse', 'analyze', 'optimize', 'vacuum',
+                 'integrity'],
+                [line.split()[0] for line in lines[1:-1]]
+            )
+            self.assertTrue(lines[-2].endswith('  ok'))
+            self.assertTrue(lines[-1].startswith('Total: '))
+            # not the statistics table analyze added
+            self.assertIn('(0 KB reclaimed)', lines[-1])
+            # planner statistics are there now
+            self.assertTrue(db.execute_sql(
+                'SELECT count(*) FROM sqlite_stat1'
+            ).fetchone()[0])
+
+    def test_vacuum_reclaims_space(self):
+        with Command(self.args):
+            for num in range(50):
+                self.add_deleted_task('old {}'.format(num),
+                                      datetime(2016, 1, 1), instances=20)
+            # make every history row take a good part of a page
+            TaskInstance.update(note='x' * 1000).execute()
+            size_before = maintenance._get_size()
+            _, lines = self.maintain()
+            self.assertLess(maintenance._get_size(), size_before)
+            self.assertFalse(lines[5].endswith(
+                maintenance.VACUUMED.format(pages=0)
+            ))
+            self.assertNotIn('(0 KB reclaimed)', lines[-1])
+
+    def test_vacuum_in_a_transaction(self):
+        with Command(self.args):
+            db.execute_sql('PRAGMA auto_vacuum = none')
+            db.execute_sql('VACUUM')
+            with db.atomic():
+                _, lines = self.maintain()
+            self.assertTrue(lines[5].endswith(maintenance.VACUUM_SKIPPED))
+
+    def test_vacuum_full(self):
+        with Command(self.args):
+            db.execute_sql('PRAGMA auto_vacuum = none')
+            db.execute_sql('VACUUM')
+            ok, lines = self.maintain()
+            self.assertTrue(ok)
+            self.assertTrue(lines[5].startswith('vacuum '))
+            self.assertNotIn(maintenance.VACUUM_SKIPPED, lines[5])
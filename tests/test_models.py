@@ -3,13 +3,26 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import os
+import sys
+from datetime import datetime
 from unittest import TestCase
 
 from peewee import IntegrityError
 from playhouse.test_utils import test_database
 
-from models import Task, TaskInstance
-from tests.data_setup import test_db
+import config
+import models
+from arghandler import ArgHandler
+from command import Command
+from models import Task, TaskInstance, db, get_schema_version
+from tests.data_setup import TEMP_DB, init_temp_database, test_db
+
+TASK_INSTANCE_INDEXES = {
+    'taskinstance_task_id_done',
+    'taskinstance_open_task_id',
+    'taskinstance_open_due',
+}
 
 
 class ModelTests(TestCase):
@@ -27,3 +40,211 @@ class ModelTests(TestCase):
             blah = Task.create(name='blah', priority=1)
             with self.assertRaises(IntegrityError):
                 TaskInstance.create(task=blah)
+
+
+class MigrationTests(TestCase):
+
+    def setUp(self):
+        self.savestdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')  # don't want creation msg
+
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.savestdout
+
+    @staticmethod
+    def get_index_names():
+        return {name for name, in db.execute_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )}
+
+    def test_new_database_is_current(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args):
+            self.assertEqual(len(models.MIGRATIONS), get_schema_version())
+            self.assertTrue(TASK_INSTANCE_INDEXES <= self.get_index_names())
+
+    def test_fast_profile_database(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        args = ArgHandler.get_args(
+            ['--database', TEMP_DB, '--db-profile', config.PROFILE_FAST]
+        )
+        with Command(args):
+            pragmas = {
+                pragma: db.execute_sql('PRAGMA ' + pragma).fetchone()[0]
+                for pragma in ['journal_mode', 'synchronous', 'temp_store',
+                               'page_size', 'auto_vacuum']
+            }
+        self.assertEqual(
+            {'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2,
+             'page_size': 4096, 'auto_vacuum': 2},
+            pragmas
+        )
+        # back to defaults for the tests that follow
+        db.init(TEMP_DB)
+
+    def test_default_profile_database(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args):
+            self.assertEqual(
+                'delete',
+                db.execute_sql('PRAGMA journal_mode').fetchone()[0]
+            )
+            self.assertEqual(
+                2,  # incremental
+                db.execute_sql('PRAGMA auto_vacuum').fetchone()[0]
+            )
+            self.assertEqual(
+                4096, db.execute_sql('PRAGMA page_size').fetchone()[0]
+            )
+
+    def test_existing_database_upgraded_on_open(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        # database as created before there were any migrations
+        db.init(TEMP_DB)
+        db.create_tables([Task, TaskInstance])
+        self.assertEqual(0, get_schema_version())
+        self.assertFalse(TASK_INSTANCE_INDEXES & self.get_index_names())
+        db.close()
+
+        args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(args):
+            self.assertEqual(len(models.MIGRATIONS), get_schema_version())
+            self.assertTrue(TASK_INSTANCE_INDEXES <= self.get_index_names())
+
+    def test_open_instances_collapsed_on_upgrade(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        db.init(TEMP_DB)
+        db.create_tables([Task, TaskInstance])
+        task = Task.create(name='sharpen pencils', priority=1)
+        other = Task.create(name='clip toenails', priority=1)
+        TaskInstance.create(task=task, due=datetime(2016, 10, 1))
+        latest = TaskInstance.create(task=task, due=datetime(2016, 10, 3))
+        TaskInstance.create(task=task, due=datetime(2016, 10, 2))
+        TaskInstance.create(task=task, due=datetime(2016, 9, 1),
+                            done=datetime(2016, 9, 2))
+        TaskInstance.create(task=other, due=datetime(2016, 10, 1))
+        TaskInstance.create(task=other, due=datetime(2016, 10, 1))
+        db.close()
+
+        args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(args):
+            open_ids = [inst.id for inst in TaskInstance.select().where(
+                TaskInstance.task == task,
+                TaskInstance.done >> None
+            )]
+            self.assertEqual([latest.id], open_ids)
+            # done instances are kept; on a due date tie, the later id
+            self.assertEqual(
+                2,
+                TaskInstance.select().where(TaskInstance.task == task).count()
+            )
+            self.assertEqual(
+                [6],
+                [inst.id for inst in TaskInstance.select().where(
+                    TaskInstance.task == other
+                )]
+            )
+            with self.assertRaises(IntegrityError):
+                TaskInstance.create(task=task, due=datetime(2016, 11, 1))
+
+    def test_deleted_tasks_dated_on_upgrade(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        # database as it was before task.deleted
+        db.init(TEMP_DB)
+        db.execute_sql(
+            'CREATE TABLE task (id INTEGER PRIMARY KEY, name VARCHAR(255) '
+            'NOT NULL UNIQUE, note VARCHAR(255), priority INTEGER NOT NULL)'
+        )
+        db.create_tables([TaskInstance])
+        db.execute_sql('PRAGMA user_version = 2')  # indexes done
+        db.execute_sql(
+            'INSERT INTO task (name, priority) '
+            "VALUES ('goner', 9), ('keep', 1)"
+        )
+        db.close()
+
+        args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(args):
+            self.assertEqual(len(models.MIGRATIONS), get_schema_version())
+            self.assertIsNotNone(Task.get(Task.name == 'goner').deleted)
+            self.assertIsNone(Task.get(Task.name == 'keep').deleted)
+
+    def test_cascade_delete_on_upgrade(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        # history table as it was before on delete cascade
+        db.init(TEMP_DB)
+        db.create_tables([Task])
+        db.execute_sql(
+            'CREATE TABLE taskinstance (id INTEGER NOT NULL PRIMARY KEY, '
+            'task_id INTEGER NOT NULL, note VARCHAR(255), '
+            'due DATETIME NOT NULL, done DATETIME, '
+            'FOREIGN KEY (task_id) REFERENCES task (id))'
+        )
+        db.execute_sql('CREATE INDEX taskinstance_task_id '
+                       'ON taskinstance (task_id)')
+        for migration in models.MIGRATIONS[:3]:
+            migration()
+        db.execute_sql('PRAGMA user_version = 3')
+        task = Task.create(name='goner', priority=9)
+        TaskInstance.create(task=task, due=datetime(2016, 10, 1),
+                            done=datetime(2016, 10, 1))
+        TaskInstance.create(task=task, due=datetime(2016, 10, 2))
+        db.execute_sql('PRAGMA foreign_keys = off')
+        TaskInstance.insert(task=999, due=datetime(2016, 10, 1)).execute()
+        db.close()
+
+        args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(args):
+            self.assertEqual(len(models.MIGRATIONS), get_schema_version())
+            self.assertTrue(TASK_INSTANCE_INDEXES <= self.get_index_names())
+            self.assertIn('taskinstance_task_id', self.get_index_names())
+            self.assertEqual(
+                [task.id, task.id],
+                [inst.task_id for inst in TaskInstance.select()]
+            )
+            task.delete_instance()
+            self.assertFalse(TaskInstance.select().exists())
+
+    def test_open_instance_lookup_uses_index(self):
+        temp_db = init_temp_database()
+        args = ArgHandler.get_args(['--database', temp_db])
+        with Command(args):
+            plan = db.execute_sql(
+                'EXPLAIN QUERY PLAN SELECT max(due) FROM taskinstance '
+                'WHERE task_id = ? AND done IS NULL', (1,)
+            ).fetchall()
+        self.assertIn('SEARCH taskinstance USING INDEX', str(plan))
+
+    def test_search_index_filled_on_upgrade(self):
+        if os.path.exists(TEMP_DB):
+            os.remove(TEMP_DB)
+        # database as it was before the search index
+        db.init(TEMP_DB, pragmas=models.CONNECT_PRAGMAS)
+        db.create_tables([Task, TaskInstance])
+        for migration in models.MIGRATIONS[:5]:
+            migration()
+        db.execute_sql('PRAGMA user_version = 5')
+        task = Task.create(name='climb mountain', priority=1)
+        TaskInstance.create(task=task, note='was rocky',
+                            due=datetime(2014, 7, 15))
+        db.close()
+
+        args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(args):
+            self.assertEqual(len(models.MIGRATIONS), get_schema_version())
+            self.assertIsNotNone(models.get_search_module())
+            self.assertEqual(
+                [(task.id,)],
+                db.execute_sql(
+                    "SELECT task_id FROM taskinstance_fts "
+                    "WHERE taskinstance_fts MATCH 'rocky'"
+                ).fetchall()
+            )
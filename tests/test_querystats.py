@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os
+
+import querystats
+from arghandler import ArgHandler
+from models import Task, db
+from querystats import QueryStats
+from tests.data_setup import (TEST_FILES_DIR, create_test_data_for_temp_db,
+                              init_temp_database)
+from tests.helpers import Redirector
+
+SLOW_LOG = TEST_FILES_DIR + 'temp_slow.log'
+
+
+class QueryStatsTests(Redirector):
+
+    def tearDown(self):
+        super(QueryStatsTests, self).tearDown()
+        if os.path.exists(SLOW_LOG):
+            os.remove(SLOW_LOG)
+
+    def test_counts_per_command(self):
+        stats = QueryStats()
+        stats.record('PRAGMA user_version', None, 0.001)
+        stats.start_command('list')
+        stats.record('SELECT 1', [], 0.002)
+        stats.record('SELECT 2', [], 0.003)
+        stats.end_command()
+        stats.start_command('stats')
+        stats.print_report()
+        self.assertEqual(
+            [querystats.STATS_HEADER,
+             querystats.STATS_LINE.format(queries=2, ms=5,
+                                          command='list'),
+             querystats.STATS_TOTAL.format(queries=3, ms=6),
+             querystats.STATS_SLOWEST],
+            self.redirect.getvalue().splitlines()[:4]
+        )
+
+    def test_slowest_kept(self):
+        stats = QueryStats()
+        for n in range(querystats.SLOWEST_KEPT * 2):
+            stats.record('SELECT ?', [n], n / 1000)
+        self.assertEqual(
+            list(range(querystats.SLOWEST_KEPT, querystats.SLOWEST_KEPT * 2)),
+            sorted(params[0] for _, _, params in stats.slowest)
+        )
+
+    def test_reset(self):
+        stats = QueryStats()
+        stats.start_command('list')
+        stats.record('SELECT 1', [], 0.002)
+        stats.reset()
+        stats.print_report()
+        self.assertEqual(
+            [querystats.NO_STATS,
+             querystats.STATS_TOTAL.format(queries=0, ms=0)],
+            self.redirect.getvalue().splitlines()
+        )
+
+    def test_slow_log(self):
+        stats = QueryStats(slow_log=SLOW_LOG, slow_ms=10)
+        stats.record('SELECT fast', [], 0.009)
+        stats.record('SELECT slow', ['wool', None], 0.010)
+        stats.close()
+        with io.open(SLOW_LOG, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertTrue(
+            lines[0].endswith(' 10.000 ms SELECT slow ["wool", null]')
+        )
+
+    def test_database_statements_recorded(self):
+        init_temp_database()
+        create_test_data_for_temp_db()
+        db.connect()
+        args = ArgHandler.get_args(['--stats'])
+        with querystats.collecting(args) as stats:
+            Task.get(Task.name == 'gather wool')
+            self.assertEqual(1, stats.queries)
+            self.assertEqual(('gather wool',), stats.slowest[0][2])
+        db.close()
+        self.assertIsNone(db.query_stats)
+        self.assertIn('Total: 1 queries', self.redirecterr.getvalue())
+
+    def test_only_collected_when_wanted(self):
+        for argv, wanted in [([], False),
+                             (['--stats'], True),
+                             (['--slow-query-log', SLOW_LOG], True)]:
+            self.assertEqual(
+                wanted, querystats.wanted(ArgHandler.get_args(argv))
+            )
+        with querystats.collecting(ArgHandler.get_args([])) as stats:
+            self.assertIsNone(stats)
+            self.assertIsNone(db.query_stats)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from datetime import datetime
+# unicode/str issue as in helpers
+from StringIO import StringIO
+from unittest import TestCase
+
+import render
+from views import TaskInstanceRow, TaskRow
+
+NOW = datetime(2016, 10, 7, 9, 30)
+
+
+class TtyOutput(StringIO):
+
+    def isatty(self):
+        return True
+
+
+class CountingOutput(StringIO):
+
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        StringIO.write(self, s)
+
+
+class RenderTests(TestCase):
+
+    def tearDown(self):
+        render.set_color_mode(render.COLOR_AUTO)
+
+    @staticmethod
+    def render_tasks(out, *dues):
+        renderer = render.Renderer(out=out, now=NOW)
+        renderer.task_header()
+        for due in dues:
+            renderer.task(TaskRow(id=1, name='fret', note=None,
+                                  priority=1, due=due))
+        renderer.flush()
+        return out.getvalue().splitlines()
+
+    def test_no_color_when_not_a_tty(self):
+        lines = self.render_tasks(StringIO(), datetime(2016, 10, 7))
+        self.assertEqual(
+            ['p  due         task                            note',
+             '1  2016-10-07  fret                            '],
+            lines
+        )
+
+    def test_color_on_a_tty(self):
+        lines = self.render_tasks(
+            TtyOutput(),
+            datetime(2016, 10, 7, 23, 59),
+            datetime(2016, 10, 8),
+            None
+        )
+        self.assertEqual(
+            '\033[0;36m'
+            'p  due         task                            note'
+            '\033[0m',
+            lines[0]
+        )
+        # due (red) until the end of its day, green after
+        self.assertTrue(lines[1].startswith(
+            '1  \033[0;31m2016-10-07\033[0m  fret'
+        ))
+        self.assertTrue(lines[2].startswith(
+            '1  \033[0;32m2016-10-08\033[0m  fret'
+        ))
+        self.assertTrue(lines[3].startswith('1              fret'))
+
+    def test_color_modes(self):
+        render.set_color_mode(render.COLOR_NEVER)
+        self.assertFalse(render.Renderer(out=TtyOutput()).color)
+        render.set_color_mode(render.COLOR_ALWAYS)
+        self.assertTrue(render.Renderer(out=StringIO()).color)
+
+    def test_due_at_midnight(self):
+        midnight = datetime(2016, 10, 7)
+        renderer = render.Renderer(out=StringIO(), now=midnight)
+        self.assertEqual(midnight, renderer.due_before)
+
+    def test_task_instances(self):
+        out = StringIO()
+        renderer = render.Renderer(out=out)
+        renderer.task_instance_header()
+        renderer.task_instance(1, TaskInstanceRow(1, NOW, 'phew'))
+        renderer.task_instance(12, TaskInstanceRow(2, None, None))
+        renderer.flush()
+        self.assertEqual(
+            ['  #  done        note',
+             '  1  2016-10-07  phew',
+             ' 12  (open)      '],
+            out.getvalue().splitlines()
+        )
+
+    def test_written_in_chunks(self):
+        out = CountingOutput()
+        renderer = render.Renderer(out=out)
+        for _ in range(render.CHUNK_SIZE // 10):
+            renderer.write('x' * 19)
+        self.assertEqual(1, out.writes)
+        renderer.flush()
+        renderer.flush()
+        self.assertEqual(2, out.writes)
+        self.assertEqual(
+            render.CHUNK_SIZE // 10 * 20,
+            len(out.getvalue())
+        )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from datetime import datetime
+
+from playhouse.test_utils import test_database
+
+import archive
+import views
+from arghandler import ArgHandler
+from command import Command
+from models import (Task, TaskInstance, TaskInstanceArchive, db,
+                    get_search_module)
+from tests.data_setup import (TEMP_DB, create_history_test_data,
+                              create_test_data, init_temp_database, test_db)
+from tests.helpers import Redirector
+
+
+def search(*terms, **kwargs):
+    return [task.name for task in views._iter_search_results(terms,
+                                                              **kwargs)]
+
+
+class SearchTests(Redirector):
+
+    def setUp(self):
+        super(SearchTests, self).setUp()
+        init_temp_database()
+        self.args = ArgHandler.get_args(['--database', TEMP_DB])
+        with Command(self.args):
+            create_test_data()
+            create_history_test_data()
+
+    def test_search_index_created(self):
+        with Command(self.args):
+            self.assertIn(get_search_module(), ['fts5', 'fts4'])
+            self.assertEqual(
+                Task.select().count(),
+                db.execute_sql('SELECT count(*) FROM task_fts').fetchone()[0]
+            )
+            # history without a note isn't indexed
+            self.assertEqual(
+                TaskInstance.select().where(
+                    TaskInstance.note.is_null(False)
+                ).count(),
+                db.execute_sql(
+                    'SELECT count(*) FROM taskinstance_fts'
+                ).fetchone()[0]
+            )
+
+    def test_search(self):
+        with Command(self.args) as interpreter:
+            interpreter.onecmd('search wool')
+            self.assertIn('gather wool', self.redirect.getvalue())
+            self.reset_redirect()
+            interpreter.onecmd('search dodo')
+            self.assertEqual(views.NO_MATCHES,
+                             self.redirect.getvalue().rstrip())
+            self.reset_redirect()
+            interpreter.onecmd('search --limit 3')
+            self.assertEqual(views.SEARCH_TERMS_REQUIRED,
+                             self.redirect.getvalue().rstrip())
+
+    def test_search_all_terms(self):
+        with Command(self.args):
+            self.assertEqual(['climb mountain'], search('back', 'it'))
+            self.assertEqual([], search('back', 'sax'))
+            # a quoted term is a phrase
+            self.assertEqual([], search('it back'))
+            self.assertEqual(['climb mountain'], search('back to it'))
+
+    def test_task_matches_first(self):
+        with Command(self.args):
+            # name, history of the same task, history of another
+            self.assertEqual(['just do it', 'climb mountain'], search('it'))
+            self.assertEqual(['climb mountain'], search('it', offset=1))
+            self.assertEqual(['just do it'], search('it', limit=1))
+
+    def test_deleted_tasks_excluded(self):
+        with Command(self.args):
+            self.assertEqual([], search('goner'))
+
+    def test_query_syntax_is_searched_for(self):
+        with Command(self.args):
+            self.assertEqual(['climb mountain'], search('phew!'))
+            for term in ['AND', 'NOT', '*', '"', 'name:', '(', 'a"b']:
+                self.assertEqual([], search(term))
+
+    def test_index_follows_changes(self):
+        with Command(self.args):
+            task = Task.get(Task.name == 'slay dragon')
+            task.note = 'bring a sword'
+            task.save()
+            self.assertEqual(['slay dragon'], search('sword'))
+            task.name = 'slay wyvern'
+            task.save()
+            self.assertEqual([], search('dragon'))
+            self.assertEqual(['slay wyvern'], search('wyvern'))
+
+            instance = TaskInstance.create(task=task, note='scorched',
+                                           due=datetime(2016, 10, 1))
+            self.assertEqual(['slay wyvern'], search('scorched'))
+            instance.note = None
+            instance.save()
+            self.assertEqual([], search('scorched'))
+            instance.note = 'singed'
+            instance.save()
+            self.assertEqual(['slay wyvern'], search('singed'))
+            instance.delete_instance()
+            self.assertEqual([], search('singed'))
+
+    def test_index_follows_archive_and_delete(self):
+        with Command(self.args):
+            archive.archive_task_instances(365, now=datetime(2016, 10, 7))
+            self.assertTrue(TaskInstanceArchive.select().exists())
+            self.assertEqual(['shave yak'], search('yakkety'))
+            self.assertEqual(['climb mountain'], search('rocky'))
+
+            Task.get(Task.name == 'shave yak').delete_instance()
+            self.assertEqual([], search('yakkety'))
+            self.assertEqual(0, db.execute_sql(
+                'SELECT count(*) FROM taskinstancearchive_fts '
+                'WHERE task_id NOT IN (SELECT id FROM task)'
+            ).fetchone()[0])
+
+    def test_search_without_index(self):
+        # a database without the search index is scanned instead
+        with test_database(test_db, (Task, TaskInstance, TaskInstanceArchive)):
+            create_test_data()
+            create_history_test_data()
+            self.assertIsNone(get_search_module(test_db))
+            self.assertEqual(['gather wool'], search('wool'))
+            self.assertEqual(['just do it', 'climb mountain'], search('it'))
+            self.assertEqual(['climb mountain'], search('back', 'it'))
+            self.assertEqual([], search('goner'))
+            # LIKE wildcards are searched for
+            self.assertEqual([], search('%'))
+            self.assertEqual([], search('_'))
+            Task.create(name='100% done', priority=1)
+            self.assertEqual(['100% done'], search('0%'))
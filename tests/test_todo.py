@@ -3,6 +3,11 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import subprocess
+import sys
+from unittest import TestCase
+
+import maintenance
 import todo
 import views
 from tests.data_setup import (create_history_test_data, create_test_data,
@@ -48,6 +53,13 @@ class OutputTests(Redirector):
             self.redirect.getvalue().rstrip()
         )
 
+    def test_maintain(self):
+        temp_db = init_temp_database()
+        todo.main(['--maintain', '--database', temp_db])
+        lines = self.redirect.getvalue().splitlines()
+        self.assertEqual(maintenance.MAINTAIN_HEADER, lines[0])
+        self.assertTrue(lines[-1].startswith('Total: '))
+
     def test_export_database_not_specified(self):
         todo.main(['--export'])
         self.assertEqual(
@@ -67,3 +79,33 @@ class OutputTests(Redirector):
         temp_db = init_temp_database()
         todo.main(['--export', '--database', temp_db])
         self.assertEqual('[]', self.redirect.getvalue().rstrip())
+
+
+class StartupTests(TestCase):
+    """ guard against heavy imports creeping back into short runs """
+
+    HEAVY_MODULES = ['cmd', 'command', 'dateutil', 'peewee',
+                     'playhouse.shortcuts', 'readline', 'views']
+
+    def get_loaded_heavy_modules(self, argv):
+        script = (
+            'import sys, todo\n'
+            'try:\n'
+            '    todo.main({argv!r})\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print(" ".join(m for m in sys.modules if sys.modules[m]))\n'
+        ).format(argv=[str(arg) for arg in argv])
+        output = subprocess.check_output([sys.executable, '-c', script])
+        loaded = output.decode('utf-8').splitlines()[-1].split()
+        return [m for m in self.HEAVY_MODULES if m in loaded]
+
+    def test_help_imports(self):
+        self.assertEqual([], self.get_loaded_heavy_modules(['--help']))
+
+    def test_export_imports(self):
+        temp_db = init_temp_database()
+        self.assertEqual(
+            ['peewee'],
+            self.get_loaded_heavy_modules(['--export', '-d', temp_db])
+        )
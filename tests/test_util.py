@@ -14,29 +14,18 @@ from tests.helpers import Redirector
 
 class DateTests(TestCase):
 
-    def test_get_list_sorting_key_value_no_date(self):
-        expected = util.get_date_string(util.SORTING_NO_DATETIME) + '1'
+    def test_get_stored_datetime(self):
+        self.assertIsNone(util.get_stored_datetime(None))
         self.assertEqual(
-            expected,
-            util.get_list_sorting_key_value({
-                'due': None,
-                'priority': 1
-            })
+            datetime(2016, 10, 4, 11, 17, 45),
+            util.get_stored_datetime('2016-10-04 11:17:45')
         )
         self.assertEqual(
-            expected,
-            util.get_list_sorting_key_value({
-                'due': None,
-                'priority': 1
-            })
+            datetime(2016, 10, 4, 11, 17, 45, 120000),
+            util.get_stored_datetime('2016-10-04 11:17:45.12')
         )
-
-    def test_get_date_for_sorting(self):
-        expected = datetime(2016, 10, 4, 11, 17, 45)
-        expected_string = util.get_date_string(expected) + '4'
-        d = {'due': expected, 'priority': 4}
-        actual = util.get_list_sorting_key_value(d)
-        self.assertEqual(expected_string, actual)
+        with self.assertRaises(ValueError):
+            util.get_stored_datetime('2016-10-04')
 
     def test_get_date_or_datetime_string_no_date(self):
         expected = ''
@@ -86,18 +75,6 @@ class DateTests(TestCase):
         with self.assertRaises(ValueError):
             util.get_datetime('2016-14-36')
 
-    def test_is_due_today(self):
-        self.assertFalse(util.is_due_today(''))
-        self.assertFalse(util.is_due_today(
-            datetime.now() + relativedelta(days=1)
-        ))
-        self.assertTrue(util.is_due_today(
-            datetime.now()
-        ))
-        self.assertTrue(util.is_due_today(
-            datetime.now() - relativedelta(days=1)
-        ))
-
     def test_is_date_format(self):
         self.assertTrue(util.is_date_format('9999-99-99'))
         self.assertTrue(util.is_date_format('9999-9-9'))
@@ -154,6 +131,43 @@ class OutputTests(Redirector):
             self.redirect.getvalue().rstrip()
         )
 
+    def test_valid_limit_number(self):
+        self.assertTrue(util.valid_limit_number(1))
+        self.assertTrue(util.valid_limit_number('25'))
+
+    def test_invalid_limit_number(self):
+        for number in ['a', '1.5', '0', -3]:
+            self.reset_redirect()
+            self.assertFalse(util.valid_limit_number(number))
+            self.assertEqual(
+                util.LIMIT_NUMBER_ERROR,
+                self.redirect.getvalue().rstrip()
+            )
+
+    def test_parse_paging_args(self):
+        args = ['2', '--limit', '10', 'due', '--page', '--offset', '3']
+        self.assertEqual(
+            {'limit': 10, 'offset': 3, 'page': True},
+            util.parse_paging_args(args)
+        )
+        self.assertEqual(['2', 'due'], args)
+        args = ['due']
+        self.assertEqual(util.PAGING_DEFAULTS, util.parse_paging_args(args))
+        self.assertEqual(['due'], args)
+
+    def test_parse_paging_args_invalid(self):
+        self.assertIsNone(util.parse_paging_args(['--limit', '0']))
+        self.assertEqual(
+            util.LIMIT_NUMBER_ERROR,
+            self.redirect.getvalue().rstrip()
+        )
+        self.reset_redirect()
+        self.assertIsNone(util.parse_paging_args(['--offset']))
+        self.assertEqual(
+            util.OFFSET_NUMBER_ERROR,
+            self.redirect.getvalue().rstrip()
+        )
+
     def test_valid_history_number(self):
         self.assertTrue(util.valid_history_number(1, 1))
         self.assertTrue(util.valid_history_number(1, 2))
@@ -400,26 +414,17 @@ class MiscTests(TestCase):
             util.remove_wrapping_quotes('\'bob"')
         )
 
-    def test_get_colored_header_or_separator(self):
-        self.assertEqual(
-            '\x1b[0;36mbilly\x1b[0m',
-            util.get_colored_header_or_footer('billy')
-        )
-
-    def test_get_colored_due_date(self):
-        self.assertEqual('', util.get_colored_due_date(None))
-        future = datetime.now() + relativedelta(days=1)
-        self.assertEqual(
-            '\x1b[0;32m' + util.get_date_string(future) + '\x1b[0m',
-            util.get_colored_due_date(future)
-        )
-        present = datetime.now()
+    def test_get_names_starting_with(self):
+        names = ['apple', 'banana', 'bandana', 'band', 'cherry']
+        names.sort()
         self.assertEqual(
-            '\x1b[0;31m' + util.get_date_string(present) + '\x1b[0m',
-            util.get_colored_due_date(present)
+            ['banana', 'band', 'bandana'],
+            util.get_names_starting_with(names, 'ban')
         )
-        past = datetime.now() - relativedelta(days=1)
         self.assertEqual(
-            '\x1b[0;31m' + util.get_date_string(past) + '\x1b[0m',
-            util.get_colored_due_date(past)
+            ['band', 'bandana'],
+            util.get_names_starting_with(names, 'band')
         )
+        self.assertEqual(names, util.get_names_starting_with(names, ''))
+        self.assertEqual([], util.get_names_starting_with(names, 'z'))
+        self.assertEqual([], util.get_names_starting_with([], 'a'))
@@ -9,15 +9,39 @@ from unittest import TestCase
 from dateutil.relativedelta import relativedelta
 from playhouse.test_utils import count_queries, test_database
 
+import render
 import util
 import views
-from models import Task, TaskInstance
-from tests.data_setup import (create_history_test_data, create_sort_test_data,
-                              create_test_data, test_db)
+from arghandler import ArgHandler
+from command import Command
+from models import Task, TaskInstance, db
+from tests.data_setup import (TEMP_DB, create_history_test_data,
+                              create_sort_test_data, create_test_data,
+                              init_temp_database, test_db)
 from tests.helpers import OutputFileTester, Redirector
+from views import TaskInstanceRow, TaskRow
 
 
-class FileTests(OutputFileTester):
+def get_open_task_instance(task_name):
+    return (TaskInstance.select()
+            .join(Task)
+            .where(Task.name == task_name, TaskInstance.done >> None)
+            .get())
+
+
+class ColorOutputFileTester(OutputFileTester):
+    """ the expected files have colors, which are off for files """
+
+    def setUp(self):
+        super(ColorOutputFileTester, self).setUp()
+        render.set_color_mode(render.COLOR_ALWAYS)
+
+    def tearDown(self):
+        super(ColorOutputFileTester, self).tearDown()
+        render.set_color_mode(render.COLOR_AUTO)
+
+
+class FileTests(ColorOutputFileTester):
 
     def test_list_tasks(self):
         self.init_test('test_list')
@@ -108,6 +132,40 @@ class OutputTests(Redirector):
             self.redirect.getvalue().rstrip()
         )
 
+    def test_next_bad_number(self):
+        views.list_next_tasks('0')
+        self.assertEqual(
+            util.LIMIT_NUMBER_ERROR,
+            self.redirect.getvalue().rstrip()
+        )
+        self.reset_redirect()
+        views.list_next_tasks('2 abc')
+        self.assertEqual(
+            util.PRIORITY_NUMBER_ERROR,
+            self.redirect.getvalue().rstrip()
+        )
+
+    def test_next_no_tasks(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            views.list_next_tasks('')
+        self.assertEqual(
+            views.NO_TASKS,
+            self.redirect.getvalue().rstrip()
+        )
+
+    def test_next_is_start_of_list(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            views.list_tasks('2')
+            lines = self.redirect.getvalue().splitlines()
+            self.reset_redirect()
+            views.list_next_tasks('2 2')
+        # header, separator, two tasks, separator
+        self.assertEqual(
+            lines[:4] + lines[-1:],
+            self.redirect.getvalue().splitlines()
+        )
+
     def test_add_bad_number(self):
         views.add_task('blah blah')
         self.assertEqual(
@@ -342,16 +400,16 @@ class DataTests(Redirector):
 
     def test_get_task_list(self):
         expected = [
-            {'note': 'pencil note', 'priority': 2,
-             'due': datetime(2016, 10, 3, 0, 0), 'id': 1,
-             'name': 'sharpen pencils'},
-            {'note': 'bo knows', 'priority': 4,
-             'due': datetime(2016, 10, 7, 5, 5), 'id': 4,
-             'name': 'just do it'},
-            {'note': None, 'priority': 1, 'due': None, 'id': 2,
-             'name': 'clip toenails'},
-            {'note': 'woolly mammoth', 'priority': 1, 'due': None,
-             'id': 3, 'name': 'gather wool'},
+            TaskRow(note='pencil note', priority=2,
+                    due=datetime(2016, 10, 3, 0, 0), id=1,
+                    name='sharpen pencils'),
+            TaskRow(note='bo knows', priority=4,
+                    due=datetime(2016, 10, 7, 5, 5), id=4,
+                    name='just do it'),
+            TaskRow(note=None, priority=1, due=None, id=2,
+                    name='clip toenails'),
+            TaskRow(note='woolly mammoth', priority=1, due=None,
+                    id=3, name='gather wool'),
         ]
         with test_database(test_db, (Task, TaskInstance)):
             create_test_data()
@@ -362,18 +420,97 @@ class DataTests(Redirector):
 
     def test_get_task_list_with_priority_filter(self):
         expected = [
-            {'note': 'pencil note', 'priority': 2,
-             'due': datetime(2016, 10, 3, 0, 0), 'id': 1,
-             'name': 'sharpen pencils'},
-            {'note': None, 'priority': 1, 'due': None, 'id': 2,
-             'name': 'clip toenails'},
-            {'note': 'woolly mammoth', 'priority': 1, 'due': None,
-             'id': 3, 'name': 'gather wool'},
+            TaskRow(note='pencil note', priority=2,
+                    due=datetime(2016, 10, 3, 0, 0), id=1,
+                    name='sharpen pencils'),
+            TaskRow(note=None, priority=1, due=None, id=2,
+                    name='clip toenails'),
+            TaskRow(note='woolly mammoth', priority=1, due=None,
+                    id=3, name='gather wool'),
         ]
         with test_database(test_db, (Task, TaskInstance)):
             create_test_data()
             self.assertEqual(expected, views._get_task_list(3))
 
+    def test_get_task_list_does_not_join_history(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_history_test_data()
+            with count_queries() as counter:
+                tasks = views._get_task_list()
+        self.assertEqual(
+            ['climb mountain', 'shave yak', 'slay dragon'],
+            [task.name for task in tasks]
+        )
+        self.assertEqual(1, counter.count)
+        sql = counter.get_queries()[0].msg[0]
+        self.assertNotIn('JOIN', sql)
+
+    def test_get_task_list_due_date_min(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            tasks = views._get_task_list(
+                priority_max=util.PRIORITY_DELETED,
+                due_date_min=datetime(2016, 10, 7, 5, 5)
+            )
+        # clip toenails and gather wool have no due date; goner is due
+        # but deleted, so sorts last
+        self.assertEqual(
+            ['sharpen pencils', 'just do it', 'goner'],
+            [task.name for task in tasks]
+        )
+
+    def test_get_task_list_limit(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            tasks = views._get_task_list(limit=2)
+        self.assertEqual(
+            ['sharpen pencils', 'just do it'],
+            [task.name for task in tasks]
+        )
+
+    def test_next_tasks(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            with count_queries() as counter:
+                tasks = views._get_next_tasks(2)
+            self.assertEqual(views._get_task_list(limit=2), tasks)
+            # tasks without a due date only read when short of dated ones
+            self.assertEqual(1, counter.count)
+            with count_queries() as counter:
+                tasks = views._get_next_tasks(3)
+            self.assertEqual(views._get_task_list(limit=3), tasks)
+            self.assertEqual(2, counter.count)
+
+    def test_next_tasks_same_day_by_priority(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            for name, priority, due in [
+                    ('early', 3, datetime(2016, 10, 1, 8)),
+                    ('urgent', 1, datetime(2016, 10, 1, 20)),
+                    ('tomorrow', 1, datetime(2016, 10, 2))]:
+                task = Task.create(name=name, priority=priority)
+                TaskInstance.create(task=task, due=due)
+            self.assertEqual(
+                ['urgent'],
+                [task.name for task in views._get_next_tasks(1)]
+            )
+            self.assertEqual(
+                views._get_task_list(limit=2),
+                views._get_next_tasks(2)
+            )
+
+    def test_next_tasks_use_open_due_index(self):
+        init_temp_database()
+        with Command(ArgHandler.get_args(['--database', TEMP_DB])):
+            sql, params = views._get_open_instances_by_due(
+                util.PRIORITY_LOW
+            ).sql()
+            plan = str(
+                db.execute_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            )
+        # read in index order: no scan of every instance, no sort
+        self.assertIn('USING INDEX taskinstance_open_due', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
     def test_get_task_names(self):
         # goner is excluded in task name listing because "deleted" (p=9)
         expected = ({
@@ -401,12 +538,12 @@ class DataTests(Redirector):
 
     def test_get_task_instance_list_with_open_instance(self):
         expected = [
-            {'id': 3, 'note': None, 'done': datetime(2012, 12, 4)},
-            {'id': 4, 'note': 'was rocky',
-             'done': datetime(2014, 8, 3)},
-            {'id': 2, 'note': None, 'done': datetime(2015, 10, 30)},
-            {'id': 1, 'note': 'phew!', 'done': datetime(2016, 4, 10)},
-            {'id': 5, 'note': 'get back to it', 'done': None},
+            TaskInstanceRow(id=3, note=None, done=datetime(2012, 12, 4)),
+            TaskInstanceRow(id=4, note='was rocky',
+                            done=datetime(2014, 8, 3)),
+            TaskInstanceRow(id=2, note=None, done=datetime(2015, 10, 30)),
+            TaskInstanceRow(id=1, note='phew!', done=datetime(2016, 4, 10)),
+            TaskInstanceRow(id=5, note='get back to it', done=None),
         ]
         with test_database(test_db, (Task, TaskInstance)):
             create_history_test_data()
@@ -416,11 +553,11 @@ class DataTests(Redirector):
             )
 
     def test_get_task_instance_list_with_no_open(self):
-        expected = [{
-            'note': 'yakkety sax',
-            'done': datetime(1976, 3, 4),
-            'id': 6,
-        }]
+        expected = [TaskInstanceRow(
+            note='yakkety sax',
+            done=datetime(1976, 3, 4),
+            id=6,
+        )]
         with test_database(test_db, (Task, TaskInstance)):
             create_history_test_data()
             self.assertEqual(
@@ -436,6 +573,33 @@ class DataTests(Redirector):
                 views._get_task_instance_list('slay dragon')
             )
 
+    def test_get_task_instance_list_no_task(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_history_test_data()
+            self.assertEqual([], views._get_task_instance_list('run'))
+
+    def test_history_single_query_without_writes(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            with count_queries() as counter:
+                instances = views.list_task_instances('sharpen pencils')
+            self.assertEqual(1, counter.count)
+            self.assertTrue(
+                counter.get_queries()[0].msg[0].startswith('SELECT')
+            )
+            self.assertEqual(
+                [datetime(2016, 10, 2, 17, 45), None],
+                [inst.done for inst in instances]
+            )
+            self.assertEqual(
+                datetime(2016, 10, 3),
+                TaskInstance.get(TaskInstance.id == instances[-1].id).due
+            )
+
+            with count_queries() as counter:
+                views.list_task_instances('run')
+            self.assertEqual(1, counter.count)
+
     def test_add_task_just_name_one_word(self):
         task_name = 'blah'
         with test_database(test_db, (Task, TaskInstance)):
@@ -494,90 +658,54 @@ class DataTests(Redirector):
             )
             task = Task.get(name=task_name)
             self.assertEqual(util.PRIORITY_DELETED, task.priority)
+            self.assertIsNotNone(task.deleted)
 
     def test_delete_task_forever(self):
         task_name = 'goner'
         with test_database(test_db, (Task, TaskInstance)):
             create_test_data()
             # goner has a task instance
-            self.assertEqual(
-                1,
-                len(TaskInstance.select().join(Task).where(
-                    Task.name == task_name
-                ))
-            )
-            views.delete_task(task_name)
+            goner = Task.get(name=task_name)
+            self.assertEqual(1, goner.instances.count())
+            # select, then begin and one delete, whatever the history
+            with count_queries() as counter:
+                views.delete_task(task_name)
+            self.assertEqual(3, counter.count)
             # verify the task is actually gone from the db
             with self.assertRaises(Task.DoesNotExist):
                 Task.get(name=task_name)
-            # verify the instances are gone, too
+            # verify the instances are gone, too (on delete cascade)
             self.assertEqual(
                 0,
-                len(TaskInstance.select().join(Task).where(
-                    Task.name == task_name
-                ))
+                TaskInstance.select().where(
+                    TaskInstance.task == goner.id
+                ).count()
             )
 
-    def test_get_open_task_instance_no_task(self):
-        with test_database(test_db, (Task, TaskInstance)):
-            with self.assertRaises(Task.DoesNotExist):
-                views._get_open_task_instance('run')
-
-    def test_get_open_task_instance_no_existing_instance(self):
-        task_name = 'stop gob'
-        with test_database(test_db, (Task, TaskInstance)):
-            Task.create(name=task_name, priority=4)
-            inst = views._get_open_task_instance(task_name)
-            self.verify_new_task_instance(inst, task_name)
-
-    def test_get_open_task_instance_no_open_instance(self):
-        """ Don't use a done task instance """
-        task_name = 'loremipsum'
-        with test_database(test_db, (Task, TaskInstance)):
-            task = Task.create(name=task_name, priority=4)
-            TaskInstance.create(
-                task=task,
-                due=date.today(),
-                done=date.today()
-            )
-            inst = views._get_open_task_instance(task_name)
-            self.verify_new_task_instance(inst, task_name)
-
-    def verify_new_task_instance(self, inst, task_name):
-        self.assertIsInstance(inst, TaskInstance)
-        self.assertEqual(task_name, inst.task.name)
-        self.assertIsNone(inst.due)
-        self.assertIsNone(inst.done)
-        self.assertTrue(inst.is_dirty())
-        self.verify_open_instance_count(task_name, 0)
-
-    def test_get_open_task_instance_existing_open_instance(self):
-        task_name = 'blech'
-        with test_database(test_db, (Task, TaskInstance)):
-            task = Task.create(name=task_name, priority=4)
-            self.verify_open_instance_count(task_name, 0)
-            TaskInstance.create(task=task, due=datetime(2015, 10, 11))
-            self.verify_open_instance_count(task_name, 1)
-            inst = views._get_open_task_instance(task_name)
-            self.assertIsInstance(inst, TaskInstance)
-            self.assertEqual(task_name, inst.task.name)
-            self.assertEqual(datetime(2015, 10, 11, 0, 0, 0), inst.due)
-            self.assertIsNone(inst.done)
-            self.assertFalse(inst.is_dirty())
-            self.verify_open_instance_count(task_name, 1)
-
-    def test_get_open_task_instance_multiple_open_instances(self):
-        task_name = 'sharpen pencils'
+    def test_get_task_and_open_instance_ids(self):
         with test_database(test_db, (Task, TaskInstance)):
-            create_test_data()
-            self.verify_open_instance_count(task_name, 3)
-            inst = views._get_open_task_instance(task_name)
-            self.verify_open_instance_count(task_name, 1)
-            self.assertIsInstance(inst, TaskInstance)
-            self.assertEqual(task_name, inst.task.name)
-            self.assertEqual(datetime(2016, 10, 3), inst.due)
-            self.assertIsNone(inst.done)
-            self.assertFalse(inst.is_dirty())
+            self.assertEqual(
+                (None, None), views._get_task_and_open_instance_ids('run')
+            )
+            task = Task.create(name='stop gob', priority=4)
+            self.assertEqual(
+                (task.id, None),
+                views._get_task_and_open_instance_ids('stop gob')
+            )
+            # a done instance isn't the open one
+            TaskInstance.create(task=task, due=date.today(),
+                                done=date.today())
+            self.assertEqual(
+                (task.id, None),
+                views._get_task_and_open_instance_ids('stop gob')
+            )
+            inst = TaskInstance.create(task=task, due=datetime(2015, 10, 11))
+            with count_queries() as counter:
+                self.assertEqual(
+                    (task.id, inst.id),
+                    views._get_task_and_open_instance_ids('stop gob')
+                )
+            self.assertEqual(1, counter.count)
 
     def verify_open_instance_count(self, task_name, expected_count):
         query = (TaskInstance.select()
@@ -677,6 +805,41 @@ class DataTests(Redirector):
             self.fuzzy_date_match(relativedelta(hours=0), inst.done)
             self.assertEqual(expected, inst.due)
 
+    def test_set_done_date_statement_count(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            # new instance: begin, select, insert
+            with count_queries() as counter:
+                views.set_done_date('clip toenails')
+            self.assertEqual(3, counter.count)
+            # open instance: begin, select, update
+            with count_queries() as counter:
+                views.set_done_date('sharpen pencils 2016-10-04')
+            self.assertEqual(3, counter.count)
+            self.verify_open_instance_count('sharpen pencils', 0)
+            inst = TaskInstance.get(
+                TaskInstance.done == datetime(2016, 10, 4)
+            )
+            self.assertEqual(datetime(2016, 10, 3), inst.due)
+
+    def test_set_due_date_statement_count(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            with count_queries() as counter:
+                views.set_due_date('sharpen pencils 2016-11-01')
+            self.assertEqual(3, counter.count)
+            self.verify_open_instance_count('sharpen pencils', 1)
+            inst = get_open_task_instance('sharpen pencils')
+            self.assertEqual(datetime(2016, 11, 1), inst.due)
+
+    def test_set_due_date_invalid_due_writes_nothing(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            views.set_due_date('sharpen pencils 5z')
+            inst = get_open_task_instance('sharpen pencils')
+            self.assertEqual(datetime(2016, 10, 3), inst.due)
+        self.assertEqual(util.DATE_ERROR, self.redirect.getvalue().rstrip())
+
 
 class MockRawInput(TestCase):
     responses = []
@@ -770,8 +933,85 @@ class EditTests(MockRawInput, Redirector):
         self.assertEqual('', views._get_response())
         self.assertEqual(': \n', self.redirect.getvalue())
 
+    def test_edit_priority_deleted(self):
+        task_name = 'gather wool'
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            self.responses = ['', str(util.PRIORITY_DELETED), '']
+            views.edit_task_or_history(task_name)
+            self.assertIsNotNone(Task.get(Task.name == task_name).deleted)
+            self.responses = ['', '1', '']
+            views.edit_task_or_history(task_name)
+            self.assertIsNone(Task.get(Task.name == task_name).deleted)
+
+
+class PagingTests(MockRawInput, Redirector):
+
+    def get_lines(self):
+        lines = self.redirect.getvalue().splitlines()
+        self.reset_redirect()
+        return lines
+
+    def test_list_limit_and_offset(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_test_data()
+            views.list_tasks('all')
+            lines = self.get_lines()
+            views.list_tasks('all --limit 2 --offset 1')
+            self.assertEqual(
+                lines[:2] + lines[3:5] + lines[-1:],
+                self.get_lines()
+            )
+            views.list_tasks('--offset 4 all')
+            self.assertEqual(lines[:2] + lines[6:], self.get_lines())
+            views.list_tasks('--offset 5 all')
+            self.assertEqual([views.NO_TASKS], self.get_lines())
+
+    def test_list_bad_paging_args(self):
+        views.list_tasks('--limit')
+        self.assertEqual([util.LIMIT_NUMBER_ERROR], self.get_lines())
+        views.list_tasks('--offset x')
+        self.assertEqual([util.OFFSET_NUMBER_ERROR], self.get_lines())
+
+    def test_history_limit_and_offset(self):
+        with test_database(test_db, (Task, TaskInstance)):
+            create_history_test_data()
+            views.list_task_history('climb mountain')
+            lines = self.get_lines()
+            views.list_task_history('climb mountain --offset 3 --limit 5')
+            # numbering carries on from the offset
+            self.assertEqual(
+                lines[:2] + lines[5:],
+                self.get_lines()
+            )
+            views.list_task_history('"climb mountain" --limit 1')
+            self.assertEqual(lines[:3] + lines[-1:], self.get_lines())
+            views.list_task_history('climb mountain --offset 5')
+            self.assertEqual([views.NO_HISTORY], self.get_lines())
+
+    def test_page(self):
+        save_page_size = views.PAGE_SIZE
+        views.PAGE_SIZE = 2
+        try:
+            with test_database(test_db, (Task, TaskInstance)):
+                create_test_data()
+                views.list_tasks('all')
+                lines = self.get_lines()
+                self.responses = ['', 'q']
+                views.list_tasks('all --page')
+                self.assertEqual(
+                    lines[:4] + [views.PAGER_PROMPT] + lines[4:6] +
+                    [views.PAGER_PROMPT + 'q'] + lines[-1:],
+                    self.get_lines()
+                )
+                # no prompt when everything fits on one page
+                views.list_task_history('gather wool --page')
+                self.assertEqual(4, len(self.get_lines()))
+        finally:
+            views.PAGE_SIZE = save_page_size
+
 
-class EditTestsIO(MockRawInput, OutputFileTester):
+class EditTestsIO(MockRawInput, ColorOutputFileTester):
 
     def test_edit(self):
         self.init_test('test_edit')
@@ -894,10 +1134,10 @@ class EditTestsIO(MockRawInput, OutputFileTester):
         self.init_test('test_edit_history_open_task_item')
         with test_database(test_db, (Task, TaskInstance)):
             create_test_data()
-            before = views._get_open_task_instance('just do it')
+            before = get_open_task_instance('just do it')
             self.assertEqual('just think about it', before.note)
             self.responses = ['', 'meh']
             views.edit_task_or_history('history just do it')
-            after = views._get_open_task_instance('just do it')
+            after = get_open_task_instance('just do it')
             self.assertEqual('meh', after.note)
         self.conclude_test()
@@ -7,8 +7,9 @@ import os
 import sys
 
 from arghandler import ArgHandler
-from command import Command
-from export import export_to_json
+
+# everything else is imported where it's needed: startup time matters
+# for short -o and --export runs, and --help shouldn't need peewee
 
 
 def main(argv=None):
@@ -26,11 +27,66 @@ def main(argv=None):
             print('Database not found: ' + args.database)
             return
 
-        export_to_json(args.database)
+        from config import get_pragmas
+        from export import export_to_json
+        from querystats import collecting
+
+        with collecting(args):
+            export_to_json(
+                args.database,
+                stream=args.stream,
+                ndjson=args.ndjson,
+                output=args.output,
+                pragmas=get_pragmas(args),
+                archived=args.archived
+            )
+        return
+
+    if args.import_file:
+        if not args.database:
+            print('Database is required for import')
+            return
+
+        from config import get_pragmas
+        from importer import import_from_json
+        from querystats import collecting
+
+        with collecting(args):
+            import_from_json(
+                args.database,
+                args.import_file,
+                pragmas=get_pragmas(args)
+            )
         return
 
+    from command import Command
+
+    if args.batch:
+        from batch import run_batch
+
+        if args.batch == '-':
+            batch_file = sys.stdin
+        elif not os.path.exists(args.batch):
+            print('Batch file not found: ' + args.batch)
+            return
+        else:
+            batch_file = open(args.batch)
+
+        with Command(args) as interpreter:
+            ok = run_batch(
+                interpreter,
+                batch_file,
+                batch_size=args.batch_size,
+                keep_going=args.keep_going
+            )
+        if batch_file is not sys.stdin:
+            batch_file.close()
+        return 0 if ok else 1
+
     with Command(args) as interpreter:
-        if args.one_command:
+        if args.maintain is not None:
+            interpreter.onecmd('maintain {days}'.format(days=args.maintain))
+        elif args.one_command:
             interpreter.onecmd(' '.join(args.one_command.split()))
         else:
             interpreter.cmdloop()  # pragma: no cover
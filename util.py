@@ -5,10 +5,9 @@ from __future__ import (absolute_import, division, print_function,
 
 import re
 import shlex
+from bisect import bisect_left, insort
 from datetime import datetime
 
-from dateutil.relativedelta import relativedelta
-
 DATE_FORMAT = '%Y-%m-%d'
 DATETIME_FORMAT = DATE_FORMAT + ' %H:%M:%S'
 SORTING_NO_DATETIME = datetime(2999, 12, 31)
@@ -16,6 +15,7 @@ SORTING_NO_DATETIME = datetime(2999, 12, 31)
 PRIORITY_HIGH = 1
 PRIORITY_LOW = 4
 PRIORITY_DELETED = 9
+PURGE_DAYS_DEFAULT = 30  # maintain: purge tasks deleted this long ago
 ALLOWED_PRIORITIES = [1, 2, 3, 4, 9]
 PRIORITY_NUMBER_ERROR = (
     '*** Priority must be a whole number between '
@@ -26,6 +26,13 @@ PRIORITY_NUMBER_ERROR = (
     )
 )
 DATE_ERROR = '*** Invalid date'
+LIMIT_NUMBER_ERROR = '*** Number must be a whole number greater than 0'
+OFFSET_NUMBER_ERROR = '*** Offset must be a whole number, 0 or greater'
+
+PAGING_LIMIT = '--limit'
+PAGING_OFFSET = '--offset'
+PAGING_PAGE = '--page'
+PAGING_DEFAULTS = {'limit': None, 'offset': 0, 'page': False}
 HISTORY_NUMBER_ERROR = '*** Invalid number'
 HISTORY_CHOICE_ERROR = '*** Invalid choice'
 
@@ -40,14 +47,50 @@ def parse_args(args):
         return None
 
 
-def get_list_sorting_key_value(x):
-    due = x['due'] if x['due'] else SORTING_NO_DATETIME
-    if x['priority'] == PRIORITY_DELETED:
-        due = SORTING_NO_DATETIME
-    return '{date}{priority}'.format(
-        date=get_date_string(due),
-        priority=x['priority']
-    )
+def parse_paging_args(args):
+    """
+    Remove --limit N, --offset N and --page from args (in place)
+
+    :param args: list of arguments
+    :return: None (invalid option value), or dict of paging options
+    """
+    paging = dict(PAGING_DEFAULTS)
+
+    if PAGING_PAGE in args:
+        args.remove(PAGING_PAGE)
+        paging['page'] = True
+
+    for option, validate in [(PAGING_LIMIT, valid_limit_number),
+                             (PAGING_OFFSET, valid_offset_number)]:
+        if option not in args:
+            continue
+        i = args.index(option)
+        value = args[i + 1] if i + 1 < len(args) else ''
+        if not validate(value):
+            return None
+        paging[option[2:]] = int(value)
+        del args[i:i + 2]
+
+    return paging
+
+
+def get_names_starting_with(sorted_names, prefix):
+    names = []
+    for i in range(bisect_left(sorted_names, prefix), len(sorted_names)):
+        if not sorted_names[i].startswith(prefix):
+            break
+        names.append(sorted_names[i])
+    return names
+
+
+def add_name(sorted_names, name):
+    insort(sorted_names, name)
+
+
+def remove_name(sorted_names, name):
+    i = bisect_left(sorted_names, name)
+    if i < len(sorted_names) and sorted_names[i] == name:
+        del sorted_names[i]
 
 
 def get_date_string(d):
@@ -62,6 +105,20 @@ def get_datetime(s):
     return datetime.strptime(s, DATETIME_FORMAT) if s else None
 
 
+def get_stored_datetime(s):
+    """
+    get_datetime for strings read from the database, which are always
+    in DATETIME_FORMAT (possibly with microseconds), without strptime
+    """
+    if not s:
+        return None
+    if len(s) < 19 or s[19:20] not in ('', '.'):
+        return get_datetime(s)
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                    int(s[11:13]), int(s[14:16]), int(s[17:19]),
+                    int(s[20:26].ljust(6, '0')) if len(s) > 20 else 0)
+
+
 def get_datetime_from_date_only_string(s):
     return datetime.strptime(s, DATE_FORMAT) if s else None
 
@@ -78,6 +135,28 @@ def valid_priority_number(number):
         return False
 
 
+def valid_limit_number(number):
+    try:
+        if int(number) > 0:
+            return True
+        else:
+            raise ValueError
+    except ValueError:
+        print(LIMIT_NUMBER_ERROR)
+        return False
+
+
+def valid_offset_number(number):
+    try:
+        if int(number) >= 0:
+            return True
+        else:
+            raise ValueError
+    except ValueError:
+        print(OFFSET_NUMBER_ERROR)
+        return False
+
+
 def valid_history_number(number, number_of_items):
     try:
         number = int(number)
@@ -91,20 +170,6 @@ def valid_history_number(number, number_of_items):
         return False
 
 
-def is_due_today(due):
-    """
-    :param due: datetime
-    :return: true if due today or before today;
-             false if empty string or due after today
-    """
-    if not due:
-        return False
-
-    due_datetime_midnight = remove_time_from_datetime(due)
-
-    return due_datetime_midnight < datetime.now()
-
-
 def get_done_date(done):
     try:
         return get_datetime_from_date_only_string(done)
@@ -122,6 +187,8 @@ def get_due_date(due_value):
     :param due_value: see command.py do_due help docstring
     :return: None (invalid due_value), or datetime object for due date
     """
+    from dateutil.relativedelta import relativedelta
+
     due_value = due_value.strip().lower()
 
     if due_value == 'now':
@@ -173,19 +240,3 @@ def remove_time_from_datetime(date_time):
 
 def remove_wrapping_quotes(text):
     return re.sub(r'''(['"])(.+)\1''', r'\2', text)
-
-
-def get_colored_header_or_footer(text):
-    return '\033[0;36m' + text + '\033[0m'  # cyan
-
-
-def get_colored_due_date(due):
-    if due is None:
-        return ''
-
-    if is_due_today(due):
-        color = '\033[0;31m'  # red
-    else:
-        color = '\033[0;32m'  # green
-
-    return color + get_date_string(due) + '\033[0m'
@@ -3,14 +3,18 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-import readline
+import re
+from collections import namedtuple
 from datetime import datetime
+from itertools import chain, islice
 
-from peewee import JOIN, IntegrityError, fn
-from playhouse.shortcuts import model_to_dict
+from peewee import JOIN, SQL, IntegrityError, fn
+from playhouse.shortcuts import case
 
+import render
 import util
-from models import Task, TaskInstance
+from models import (SEARCH_INDEXED, Task, TaskInstance, TaskInstanceArchive,
+                    get_search_module)
 
 EDIT_CANCELLED = 'Edit cancelled'
 NO_HISTORY = 'No history'
@@ -29,52 +33,81 @@ TASK_NAME_REQUIRED = '*** Task name required'
 TASK_NOT_FOUND = '*** Task not found'
 TASK_REALLY_DELETED = 'REALLY deleted task: '
 TASKS_DUE = 'due'
+TASKS_NEXT_DEFAULT = 5
+PAGE_SIZE = 20
+PAGER_PROMPT = "-- more ('q' to quit) --"
+HISTORY_ARCHIVED = '--archived'
+NO_MATCHES = 'No matching tasks'
+SEARCH_TERMS_REQUIRED = '*** Search terms required'
+SEARCH_LIMIT_DEFAULT = 20
 
+# the open instance due date column of the task list query (sqlite lets
+# us use the alias in WHERE and ORDER BY)
+LIST_DUE = SQL('due')
 
-def add_task(args):
+# rows of the task list and history reads: plain tuples rather than
+# model instances (or dicts), as there can be a lot of them
+TaskRow = namedtuple('TaskRow', ['id', 'name', 'note', 'priority', 'due'])
+TaskInstanceRow = namedtuple('TaskInstanceRow', ['id', 'done', 'note'])
+
+
+# the command functions below return False if the command failed (its
+# error message printed), True otherwise; those that add, rename or
+# delete tasks keep task_names (sorted names of the non-deleted tasks,
+# for tab completion) up to date if given
+
+
+def add_task(args, task_names=None):
     args = util.parse_args(args)
 
     if args is None:
-        return
+        return False
     elif len(args) == 0:
         print(TASK_NAME_REQUIRED)
-        return
+        return False
 
     name = args[0]
 
     priority = 1 if len(args) == 1 else args[1]
     if not util.valid_priority_number(priority):
-        return
+        return False
 
     note = ' '.join(args[2:]) if len(args) > 2 else None
+    priority = int(priority)
+    deleted = datetime.now().replace(microsecond=0) \
+        if priority == util.PRIORITY_DELETED else None
 
     try:
-        Task.create(name=name, priority=int(priority), note=note)
-        print(TASK_ADDED + name)
+        Task.create(name=name, priority=priority, note=note, deleted=deleted)
     except IntegrityError:
         print(TASK_ALREADY_EXISTS)
+        return False
+    if task_names is not None and priority != util.PRIORITY_DELETED:
+        util.add_name(task_names, name)
+    print(TASK_ADDED + name)
+    return True
 
 
-def edit_task_or_history(args):
+def edit_task_or_history(args, task_names=None):
     args = util.parse_args(args)
 
     if args is None:
-        return
+        return False
     elif len(args) == 0:
         print(TASK_NAME_REQUIRED)
-        return
+        return False
     elif len(args) > 1 and args[0] == 'history':
-        _edit_task_history(' '.join(args[1:]))
-        return
+        return _edit_task_history(' '.join(args[1:]))
 
     try:
-        _edit_task(Task.get(Task.name == ' '.join(args)))
+        task = Task.get(Task.name == ' '.join(args))
     except Task.DoesNotExist:
         print(TASK_NOT_FOUND)
-        return
+        return False
+    return _edit_task(task, task_names)
 
 
-def _edit_task(task):
+def _edit_task(task, task_names=None):
 
     print("Editing task ('q' to cancel)...")
 
@@ -82,7 +115,7 @@ def _edit_task(task):
     while True:
         new_name = _get_response('Name', task.name)
         if _edit_cancelled(new_name):
-            return
+            return False
         elif new_name != task.name:
             if (Task.select().where(Task.name == new_name)).exists():
                 print(TASK_ALREADY_EXISTS)
@@ -94,25 +127,36 @@ def _edit_task(task):
         # noinspection PyCompatibility
         new_priority = _get_response('Priority', unicode(task.priority))
         if _edit_cancelled(new_priority):
-            return
+            return False
         elif util.valid_priority_number(new_priority):
             break
 
     new_note = _get_note(task.note)
     if _edit_cancelled(new_note):
-        return
+        return False
+
+    new_priority = int(new_priority)
+    if new_priority != task.priority:
+        task.deleted = datetime.now().replace(microsecond=0) \
+            if new_priority == util.PRIORITY_DELETED else None
+
+    if task_names is not None:
+        util.remove_name(task_names, task.name)
+        if new_priority != util.PRIORITY_DELETED:
+            util.add_name(task_names, new_name)
 
     task.name = new_name
-    task.priority = int(new_priority)
+    task.priority = new_priority
     task.note = new_note
     task.save()
     print(TASK_UPDATED)
+    return True
 
 
 def _edit_task_history(task_name):
     instances = list_task_instances(task_name)
     if not instances:
-        return
+        return False
 
     print("Editing task history ('q' to cancel)...")
 
@@ -131,13 +175,13 @@ def _edit_task_history(task_name):
         )
 
         if _edit_cancelled(task_num):
-            return
+            return False
         elif util.valid_history_number(task_num, num_items):
             break
 
     # noinspection PyTypeChecker
     task_instance = TaskInstance.get(
-        TaskInstance.id == instances[int(task_num) - 1]['id']
+        TaskInstance.id == instances[int(task_num) - 1].id
     )
 
     # can only set done date on done tasks;
@@ -151,12 +195,12 @@ def _edit_task_history(task_name):
                 old_value=date_str
             )
             if _edit_cancelled(new_done_date):
-                return
+                return False
             elif new_done_date == 'DELETE':
                 task_instance.delete_instance()
                 print(TASK_DELETED_HISTORY + date_str)
                 print(TASK_UPDATED_HISTORY)
-                return
+                return True
 
             try:
                 new_done_date = util.get_datetime_from_date_only_string(
@@ -169,15 +213,25 @@ def _edit_task_history(task_name):
 
     new_note = _get_note(task_instance.note)
     if _edit_cancelled(new_note):
-        return
+        return False
 
     task_instance.note = new_note
     task_instance.save()
     print(TASK_UPDATED_HISTORY)
+    return True
+
+
+def _get_readline():
+    # line editing for raw_input: loaded by the first prompt, not at
+    # startup
+    import readline
+    return readline
 
 
 # noinspection PyCompatibility
 def _get_response(prompt='', old_value='', prompt_default=None):
+    _get_readline()
+
     if old_value:
         default = ' [{value}]'.format(
             value=old_value if not prompt_default else prompt_default
@@ -201,7 +255,7 @@ def _get_response(prompt='', old_value='', prompt_default=None):
 def _get_note(note):
     if note:
         # add note to history so we can up-arrow to edit
-        readline.add_history(note)
+        _get_readline().add_history(note)
 
     new_note = _get_response(
         prompt='Note',
@@ -223,68 +277,78 @@ def _edit_cancelled(value):
         return False
 
 
-def delete_task(task_name):
+def delete_task(task_name, task_names=None):
     # since no shlex parsing, this will remove quotes if present
     task_name = util.remove_wrapping_quotes(task_name)
     if not task_name:
         print(TASK_NAME_REQUIRED)
-        return
+        return False
 
     try:
         task = Task.get(name=task_name)
     except Task.DoesNotExist:
         print(TASK_NOT_FOUND)
-        return
+        return False
 
     if task.priority == util.PRIORITY_DELETED:
-        task.delete_instance(recursive=True)
+        # one statement: the database deletes the history (on delete
+        # cascade)
+        with _atomic():
+            task.delete_instance()
         print(TASK_REALLY_DELETED + task_name)
     else:
         task.priority = util.PRIORITY_DELETED
+        task.deleted = datetime.now().replace(microsecond=0)
         task.save()
         print(TASK_DELETED + task_name)
 
+    if task_names is not None:
+        util.remove_name(task_names, task_name)
+    return True
+
 
 def set_due_date(args):
     args = util.parse_args(args)
 
     if args is None:
-        return
+        return False
     elif len(args) < 2:
         print(TASK_NAME_AND_DUE_REQUIRED)
-        return
+        return False
 
     task_name = ' '.join(args[:-1])
     due_value = args[-1]
 
-    try:
-        Task.get(name=task_name)
-    except Task.DoesNotExist:
-        print(TASK_NOT_FOUND + ': ' + task_name)
-        return
+    with _atomic():
+        task_id, open_inst_id = _get_task_and_open_instance_ids(task_name)
+        if task_id is None:
+            print(TASK_NOT_FOUND + ': ' + task_name)
+            return False
 
-    open_inst = _get_open_task_instance(task_name)
-    due_datetime = util.get_due_date(due_value)
-    if due_datetime:
-        open_inst.due = due_datetime
-        open_inst.save()
+        due_datetime = util.get_due_date(due_value)
+        if due_datetime:
+            _save_open_task_instance(task_id, open_inst_id, due=due_datetime)
 
-        if due_datetime != util.remove_time_from_datetime(due_datetime):
-            due_set = util.get_datetime_string(due_datetime)
-        else:
-            due_set = util.get_date_string(due_datetime)
-        print(TASK_DUE_DATE_SET + due_set)
+    if not due_datetime:
+        return False
+
+    if due_datetime != util.remove_time_from_datetime(due_datetime):
+        due_set = util.get_datetime_string(due_datetime)
+    else:
+        due_set = util.get_date_string(due_datetime)
+    print(TASK_DUE_DATE_SET + due_set)
+    return True
 
 
 def set_done_date(args):
     args = util.parse_args(args)
 
     if args is None:
-        return
+        return False
     elif len(args) == 0 or \
             (len(args) == 1 and util.is_date_format(args[0])):
         print(TASK_NAME_REQUIRED)
-        return
+        return False
 
     done = datetime.now().replace(microsecond=0)
     task_name = args[0]
@@ -292,31 +356,74 @@ def set_done_date(args):
         if util.is_date_format(args[-1]):
             done = util.get_done_date(args[-1])
             if not done:
-                return
+                return False
             task_name = ' '.join(args[:-1])
         else:
             task_name = ' '.join(args)
 
-    try:
-        Task.get(name=task_name)
-    except Task.DoesNotExist:
-        print(TASK_NOT_FOUND)
+    with _atomic():
+        task_id, open_inst_id = _get_task_and_open_instance_ids(task_name)
+        if task_id is None:
+            print(TASK_NOT_FOUND)
+            return False
+
+        if open_inst_id is None:
+            _save_open_task_instance(task_id, None, due=done, done=done)
+        else:
+            _save_open_task_instance(task_id, open_inst_id, done=done)
+
+    print(TASK_DONE_DATE_SET + util.get_datetime_string(done))
+    return True
+
+
+def _atomic():
+    # the models' database rather than models.db, which tests swap out
+    return Task._meta.database.atomic()
+
+
+def _get_task_and_open_instance_ids(task_name):
+    """
+    :return: (task id, id of the open instance or None) in one query,
+             or (None, None) if there is no such task
+    """
+    row = (Task
+           .select(Task.id, TaskInstance.id)
+           .join(
+                TaskInstance,
+                JOIN.LEFT_OUTER,
+                on=((TaskInstance.task == Task.id) &
+                    (TaskInstance.done >> None))
+            )
+           .where(Task.name == task_name)
+           .tuples()
+           .first())
+
+    return row if row else (None, None)
+
+
+def _save_open_task_instance(task_id, open_inst_id, **values):
+    """ update the open instance (or add one) with the given values """
+    if open_inst_id is None:
+        TaskInstance.insert(task=task_id, **values).execute()
         return
 
-    open_inst = _get_open_task_instance(task_name)
-    if not open_inst.due:
-        open_inst.due = done
-    open_inst.done = done
-    open_inst.save()
-    print(TASK_DONE_DATE_SET + util.get_datetime_string(open_inst.done))
+    (TaskInstance
+     .update(**values)
+     .where(TaskInstance.id == open_inst_id)
+     .execute())
 
 
 def list_tasks(args):
     args = util.parse_args(args)
 
     if args is None:
-        return
-    elif TASKS_DUE in args:
+        return False
+
+    paging = util.parse_paging_args(args)
+    if paging is None:
+        return False
+
+    if TASKS_DUE in args:
         args.remove(TASKS_DUE)
         due_date_min = datetime.now()
     else:
@@ -327,175 +434,308 @@ def list_tasks(args):
         if priority_max in TASK_DELETED_ALIASES:
             priority_max = util.PRIORITY_DELETED
         if not util.valid_priority_number(priority_max):
-            return
+            return False
     else:
         priority_max = util.PRIORITY_LOW
 
-    tasks = _get_task_list(
+    tasks = _peek(_iter_task_list(
         priority_max=int(priority_max),
-        due_date_min=due_date_min
-    )
+        due_date_min=due_date_min,
+        limit=paging['limit'],
+        offset=paging['offset']
+    ))
+    if tasks is None:
+        print(NO_TASKS)
+    else:
+        _print_task_list(tasks, paged=paging['page'])
+    return True
+
+
+def list_next_tasks(args):
+    args = util.parse_args(args)
+
+    if args is None:
+        return False
+
+    limit = args[0] if args else TASKS_NEXT_DEFAULT
+    if not util.valid_limit_number(limit):
+        return False
+
+    priority_max = args[1] if len(args) > 1 else util.PRIORITY_LOW
+    if not util.valid_priority_number(priority_max):
+        return False
+
+    tasks = _get_next_tasks(int(limit), priority_max=int(priority_max))
     if tasks:
         _print_task_list(tasks)
     else:
         print(NO_TASKS)
+    return True
 
 
 # aka history
-def list_task_instances(task_name):
+def list_task_history(args):
+    """ history command: task name with optional paging arguments """
+    words = args.split() if args else []
+    paging = util.parse_paging_args(words)
+    if paging is None:
+        return False
+
+    archived = HISTORY_ARCHIVED in words
+    if archived:
+        words.remove(HISTORY_ARCHIVED)
+
+    if paging != util.PAGING_DEFAULTS or archived:
+        args = ' '.join(words)
+
+    return list_task_instances(
+        args,
+        limit=paging['limit'],
+        offset=paging['offset'],
+        page=paging['page'],
+        archived=archived
+    ) is not False
+
+
+def list_task_instances(task_name, limit=None, offset=0, page=False,
+                        archived=False):
+    """
+    :return: False (no task name, or task not found), None (no history
+             or paged), or list of the TaskInstanceRow printed
+    """
     task_name = util.remove_wrapping_quotes(task_name)
 
     if not task_name:
         print(TASK_NAME_REQUIRED)
-        return
+        return False
 
-    try:
-        Task.get(name=task_name)
-    except Task.DoesNotExist:
+    instances = _get_task_instances(task_name, archived=archived)
+    if instances is None:
         print(TASK_NOT_FOUND)
-        return None
+        return False
 
-    instances = _get_task_instance_list(task_name)
-    if instances:
-        _print_task_instance_list(instances)
-        return instances
-    else:
+    stop = offset + limit if limit else None
+    instances = _peek(islice(instances, offset, stop))
+    if instances is None:
         print(NO_HISTORY)
         return None
+    elif page:
+        _print_task_instance_list(instances, first_num=offset + 1,
+                                  paged=True)
+        return None
+    else:
+        instances = list(instances)
+        _print_task_instance_list(instances, first_num=offset + 1)
+        return instances
 
 
-def _print_task_list(tasks):
-    _print_task('p', 'due', 'task', 'note', header=True)
-    separator = util.get_colored_header_or_footer('-' * 80)
-    print(separator)
-    for task in tasks:
-        _print_task(
-            priority=task['priority'],
-            due=util.get_colored_due_date(task['due']),
-            name=task['name'],
-            note=task['note']
-        )
-    print(separator)
+def _peek(rows):
+    """ None if there are no rows, otherwise an iterator over them all """
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return None
+    return chain([first], rows)
 
 
-def _print_task(priority='', due='', name='', note=None, header=False):
-    note = '' if not note else note
-    line = '{priority:1}  {due:10}  {name:30}  {note}'.format(
-        priority=priority,
-        due=due,
-        name=name,
-        note=note
-    )
-    if header:
-        print(util.get_colored_header_or_footer(line))
-    else:
-        print(line)
+def _paged(rows, before_prompt=None):
+    """ pass rows through, asking to go on after every PAGE_SIZE rows """
+    for num, row in enumerate(rows):
+        if num and num % PAGE_SIZE == 0:
+            if before_prompt:
+                before_prompt()
+            if raw_input(PAGER_PROMPT).strip().lower() == 'q':
+                return
+        yield row
 
 
-def _print_task_instance_list(instances):
-    _print_task_instance('#', 'done', 'note', header=True)
-    separator = util.get_colored_header_or_footer('~' * 50)
-    print(separator)
-    num = 0
-    for inst in instances:
-        num += 1
-        # noinspection PyCompatibility
-        _print_task_instance(
-            num=unicode(num),
-            done=util.get_date_string(inst['done']),
-            note=inst['note']
+def _print_task_list(tasks, paged=False):
+    renderer = render.Renderer()
+    separator = '-' * 80
+    try:
+        renderer.task_header()
+        renderer.header(separator)
+        # the rows so far have to be out before asking for more
+        for task in _paged(tasks, renderer.flush) if paged else tasks:
+            renderer.task(task)
+        renderer.header(separator)
+    finally:
+        renderer.flush()
+
+
+def _print_task_instance_list(instances, first_num=1, paged=False):
+    renderer = render.Renderer()
+    separator = '~' * 50
+    try:
+        renderer.task_instance_header()
+        renderer.header(separator)
+        if paged:
+            instances = _paged(instances, renderer.flush)
+        for num, inst in enumerate(instances, first_num):
+            renderer.task_instance(num, inst)
+        renderer.header(separator)
+    finally:
+        renderer.flush()
+
+
+def _get_task_list(priority_max=util.PRIORITY_LOW, due_date_min=None,
+                   limit=None, offset=0):
+    return list(_iter_task_list(
+        priority_max=priority_max,
+        due_date_min=due_date_min,
+        limit=limit,
+        offset=offset
+    ))
+
+
+def _iter_task_list(priority_max=util.PRIORITY_LOW, due_date_min=None,
+                    limit=None, offset=0, undated_only=False):
+    """
+    :param undated_only: only the tasks that sort last: those without a
+                         due date, and deleted ones
+    """
+    # only the task columns and the open instance's due date; history
+    # rows are never read
+    query = (Task
+             .select(
+                Task.id,
+                Task.name,
+                Task.note,
+                Task.priority,
+                _get_open_due_date_subquery().alias('due')
+             )
+             .where(Task.priority <= priority_max)
+             .order_by(*_get_list_sorting_order()))
+
+    if due_date_min:
+        query = query.where(
+            LIST_DUE <= util.get_datetime_string(due_date_min)
+        )
+    if undated_only:
+        query = query.where(
+            (Task.priority == util.PRIORITY_DELETED) | (LIST_DUE >> None)
         )
-    print(separator)
-
 
-def _print_task_instance(num='', done='', note=None, header=False):
-    note = '' if not note else note
-    line = '{num:>3}  {done:10}  {note}'.format(
-        num=num,
-        done=done if done else '(open)',
-        note=note
-    )
-    if header:
-        print(util.get_colored_header_or_footer(line))
-    else:
-        print(line)
+    # sqlite keeps only the top rows while sorting when there's a limit
+    if limit:
+        query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
 
+    for task_id, name, note, priority, due in query.tuples().iterator():
+        yield TaskRow(task_id, name, note, priority,
+                      util.get_stored_datetime(due))
 
-def _get_task_list(priority_max=util.PRIORITY_LOW, due_date_min=None):
-    subquery = (TaskInstance
-                .select(fn.Max(TaskInstance.due))
-                .where(
-                    TaskInstance.task_id == Task.id,
-                    TaskInstance.done >> None
-                ))
 
-    query = (Task
-             .select(Task, TaskInstance, subquery.alias('due'))
-             .join(TaskInstance, JOIN.LEFT_OUTER)
-             .where(Task.priority <= priority_max))
+def _get_next_tasks(limit, priority_max=util.PRIORITY_LOW):
+    """
+    The first limit rows of the task list, read from the open instances
+    in due order rather than by sorting every task: those due on the
+    day of the last one shown are read too, as the list orders a day's
+    tasks by priority. Tasks without a due date (or deleted) come last,
+    so they're only read if there are fewer open ones than that.
 
+    :return: list of TaskRow
+    """
     tasks = []
-    for row in query.aggregate_rows():
+    query = _get_open_instances_by_due(priority_max)
+    for task_id, name, note, priority, due in query.tuples().iterator():
+        if len(tasks) >= limit and due.date() != tasks[-1].due.date():
+            break
+        tasks.append(TaskRow(task_id, name, note, priority, due))
 
-        if due_date_min and \
-            (row.due is None or
-             util.get_datetime(row.due) > due_date_min):
-                continue
+    tasks.sort(key=lambda task: (task.due.date(), task.priority, task.id))
+    del tasks[limit:]
 
-        task = model_to_dict(row)
-        task['due'] = util.get_datetime(row.due)
-        tasks.append(task)
+    if len(tasks) < limit:
+        tasks.extend(_iter_task_list(
+            priority_max=priority_max,
+            undated_only=True,
+            limit=limit - len(tasks)
+        ))
+    return tasks
 
-    sorted_tasks = sorted(
-        tasks,
-        key=util.get_list_sorting_key_value
-    )
 
-    return sorted_tasks
+def _get_open_instances_by_due(priority_max):
+    # walks taskinstance_open_due, so no sort
+    return (TaskInstance
+            .select(Task.id, Task.name, Task.note, Task.priority,
+                    TaskInstance.due)
+            .join(Task)
+            .where(
+                # a literal NULL: sqlite won't use a partial index for a
+                # bound one
+                TaskInstance.done >> SQL('NULL'),
+                Task.priority <= priority_max,
+                Task.priority != util.PRIORITY_DELETED
+            )
+            .order_by(TaskInstance.due))
+
+
+def _get_open_due_date_subquery():
+    return (TaskInstance
+            .select(fn.Max(TaskInstance.due))
+            .where(
+                TaskInstance.task_id == Task.id,
+                TaskInstance.done >> None
+            ))
+
+
+def _get_list_sorting_order():
+    """
+    Due date (day only; tasks without one, and deleted tasks, last),
+    then priority
+    """
+    sort_date = case(
+        None,
+        [((Task.priority == util.PRIORITY_DELETED) | (LIST_DUE >> None),
+          util.get_date_string(util.SORTING_NO_DATETIME))],
+        fn.date(LIST_DUE)
+    )
+    # id last to keep the original (insertion) order of ties
+    return [sort_date, Task.priority, Task.id]
 
 
 def _get_task_instance_list(task_name):
-    query = (TaskInstance.select()
-             .join(Task)
-             .where(
-                Task.name == task_name,
-                ~(TaskInstance.done >> None)
-              )
-             .order_by(TaskInstance.done))
+    instances = _get_task_instances(task_name)
+    return list(instances) if instances is not None else []
 
-    instances = []
-    for inst in query:
-        instances.append({
-            'id': inst.id,
-            'done': inst.done,
-            'note': inst.note,
-         })
 
-    open_inst = _get_open_task_instance(task_name)
-    if open_inst.id is not None:  # existing open instance
-        instances.append({
-            'id': open_inst.id,
-            'done': open_inst.done,
-            'note': open_inst.note,
-        })
+def _get_task_instances(task_name, archived=False):
+    """
+    History of a task from one query (and no writes): done instances
+    in done order, then the open instance, if any
 
-    return instances
-
-
-def _get_open_task_instance(task_name):
-    query = (TaskInstance.select()
-             .join(Task)
-             .where(Task.name == task_name, TaskInstance.done >> None)
-             .order_by(TaskInstance.due.desc()))
-
-    if not query:
-        return TaskInstance(task=Task.get(Task.name == task_name))
+    :param archived: include the archived history (see archive.py)
+    :return: None (task not found), or iterator of TaskInstanceRow
+    """
+    # left join: a task without history still gives one (empty) row;
+    # the open instance sorts last
+    query = (Task
+             .select(TaskInstance.id, TaskInstance.done, TaskInstance.note,
+                     (TaskInstance.done >> None).alias('is_open'))
+             .join(TaskInstance, JOIN.LEFT_OUTER)
+             .where(Task.name == task_name))
+
+    if archived:
+        query = query.union_all(
+            TaskInstanceArchive
+            .select(TaskInstanceArchive.id, TaskInstanceArchive.done,
+                    TaskInstanceArchive.note, SQL('0'))
+            .join(Task)
+            .where(Task.name == task_name)
+        )
 
-    # delete orphaned open task instances
-    for inst in query[1:]:
-        inst.delete_instance()
+    # by result column, which is all a union can be ordered by
+    query = query.order_by(SQL('is_open'), SQL('done'))
 
-    return query[0]
+    rows = query.tuples().iterator()
+    first = next(rows, None)
+    if first is None:
+        return None
+    return (TaskInstanceRow._make(row[:3])
+            for row in chain([first], rows) if row[0] is not None)
 
 
 def get_task_names(starting_with=''):
@@ -508,3 +748,112 @@ def get_task_names(starting_with=''):
     for task in query:
         tasks.append(task.name)
     return tasks
+
+
+def search_tasks(args):
+    """ search command: terms with optional paging arguments """
+    terms = util.parse_args(args)
+    if terms is None:
+        return False
+
+    paging = util.parse_paging_args(terms)
+    if paging is None:
+        return False
+
+    if not terms:
+        print(SEARCH_TERMS_REQUIRED)
+        return False
+
+    tasks = _peek(_iter_search_results(
+        terms,
+        limit=paging['limit'] if paging['limit'] else SEARCH_LIMIT_DEFAULT,
+        offset=paging['offset']
+    ))
+    if tasks is None:
+        print(NO_MATCHES)
+    else:
+        _print_task_list(tasks, paged=paging['page'])
+    return True
+
+
+def _iter_search_results(terms, limit=SEARCH_LIMIT_DEFAULT, offset=0):
+    """
+    Non-deleted tasks whose name and note, or one of whose (archived)
+    history notes, contain all the terms: best matches first, tasks
+    matched by name or note before those matched by history
+
+    :return: iterator of TaskRow
+    """
+    database = Task._meta.database
+    hits, params = _get_search_hits(get_search_module(database), terms)
+
+    # score (bm25 with fts5, 0 otherwise): lower is better
+    sql = (
+        'SELECT task.id, task.name, task.note, task.priority, ('
+        'SELECT max(due) FROM taskinstance '
+        'WHERE task_id = task.id AND done IS NULL) '
+        'FROM ({hits}) AS hit JOIN task ON task.id = hit.task_id '
+        'WHERE task.priority != ? '
+        'GROUP BY task.id '
+        'ORDER BY min(hit.source), min(hit.score), task.id '
+        'LIMIT ? OFFSET ?'
+    ).format(hits=hits)
+    params += [util.PRIORITY_DELETED, limit, offset]
+
+    for task_id, name, note, priority, due in database.execute_sql(
+        sql, params
+    ):
+        yield TaskRow(task_id, name, note, priority,
+                      util.get_stored_datetime(due))
+
+
+def _get_search_hits(module, terms):
+    """
+    :param module: search index module (models.get_search_module)
+    :return: (sql, params) for (task_id, source, score) rows, where
+             source is 0 for a task name or note, 1 for a history note
+    """
+    selects = []
+    params = []
+
+    if module:
+        # each term a phrase, so that no input is taken as query syntax
+        match = ' '.join('"' + term.replace('"', '""') + '"'
+                         for term in terms)
+        for table, kind in SEARCH_INDEXED:
+            selects.append(
+                'SELECT {task_id} AS task_id, {source} AS source, '
+                '{score} AS score FROM {table}_fts '
+                'WHERE {table}_fts MATCH ?'.format(
+                    task_id='rowid' if kind == 'task' else 'task_id',
+                    source=0 if kind == 'task' else 1,
+                    score='bm25({table}_fts)'.format(table=table)
+                    if module == 'fts5' else 0,
+                    table=table
+                )
+            )
+            params.append(match)
+    else:
+        # no search index: scan
+        patterns = ['%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+                    for term in terms]
+        for table, kind in SEARCH_INDEXED:
+            if kind == 'task':
+                condition = ("(name LIKE ? ESCAPE '\\' OR "
+                             "note LIKE ? ESCAPE '\\')")
+                selects.append(
+                    'SELECT id AS task_id, 0 AS source, 0 AS score '
+                    'FROM task WHERE ' + ' AND '.join([condition] * len(terms))
+                )
+                for pattern in patterns:
+                    params += [pattern, pattern]
+            else:
+                condition = "note LIKE ? ESCAPE '\\'"
+                selects.append(
+                    'SELECT task_id, 1, 0 FROM {table} WHERE '.format(
+                        table=table
+                    ) + ' AND '.join([condition] * len(terms))
+                )
+                params += patterns
+
+    return ' UNION ALL '.join(selects), params